@@ -10,6 +10,11 @@ from scipy.stats import pearsonr, spearmanr
 current_script_dir = os.path.dirname(os.path.abspath(__file__))
 src_dir = os.path.dirname(current_script_dir)
 backend_dir = os.path.dirname(src_dir)
+sys.path.append(src_dir)
+
+from utils.flight_store import flight_data_exists
+from utils.delay_cube import load_delay_cube, load_delay_sketch, rollup, count_between
+from utils.delay_sketch import sketch_quantiles
 
 VOLUME_SUMMARY_PATH = os.path.join(backend_dir, 'results', 'tables', 'airport_volume_analysis_summary.csv')
 DELAYS_DATA_PATH = os.path.join(backend_dir, 'data', 'processed', 'delays', 'delays_consolidated_filtered.csv')
@@ -42,29 +47,32 @@ def classify_airport(total_flights):
 
 
 def compute_airport_delays(delays_path):
-    print("Loading flight delay data (this may take a while)...")
-    df = pd.read_csv(
-        delays_path,
-        usecols=['SchedDepApt', 'MinLateDeparted', 'MinLateArrived', 'Cancelled'],
-        low_memory=False
-    )
-
-    df['Cancelled'] = pd.to_numeric(df['Cancelled'], errors='coerce').fillna(0)
-    df = df[df['Cancelled'] == 0].copy()
-
-    df['MinLateDeparted'] = pd.to_numeric(df['MinLateDeparted'], errors='coerce').fillna(0)
-    df['MinLateArrived'] = pd.to_numeric(df['MinLateArrived'], errors='coerce').fillna(0)
-
-    airport_delays = df.groupby('SchedDepApt').agg(
-        avg_dep_delay=('MinLateDeparted', 'mean'),
-        median_dep_delay=('MinLateDeparted', 'median'),
-        pct_delayed_15=('MinLateDeparted', lambda x: (x > 15).mean() * 100),
-        avg_arr_delay=('MinLateArrived', 'mean'),
-        n_flights_operated=('MinLateDeparted', 'count')
-    ).reset_index()
+    print("Loading airport delay cube...")
+    cube = load_delay_cube(delays_path)
+    airport_delays = rollup(cube, ['airport'], direction='dep')
+    airport_delays = airport_delays[airport_delays['n_operated'] > 0]
+
+    n_operated = airport_delays['n_operated']
+    airport_delays = pd.DataFrame({
+        'airport_code': airport_delays['airport'].astype(str),
+        'avg_dep_delay': airport_delays['dep_delay_sum'] / n_operated,
+        'pct_delayed_15': count_between(airport_delays, 'dep', lo=16) / n_operated * 100,
+        'avg_arr_delay': airport_delays['arr_delay_sum'] / n_operated,
+        'n_flights_operated': n_operated
+    })
 
-    airport_delays.rename(columns={'SchedDepApt': 'airport_code'}, inplace=True)
-    airport_delays = airport_delays.round(3)
+    quantiles = sketch_quantiles(load_delay_sketch(delays_path), ['airport'], direction='dep').set_index('airport')
+    quantiles.index = quantiles.index.astype(str)
+    airport_delays.insert(2, 'median_dep_delay', airport_delays['airport_code'].map(quantiles['p50']))
+    airport_delays.insert(3, 'p90_dep_delay', airport_delays['airport_code'].map(quantiles['p90']))
+    airport_delays.insert(4, 'p99_dep_delay', airport_delays['airport_code'].map(quantiles['p99']))
+
+    airport_delays = airport_delays.reset_index(drop=True).round(3)
+    airport_delays = airport_delays.astype({
+        'airport_code': str, 'avg_dep_delay': float, 'median_dep_delay': float,
+        'p90_dep_delay': float, 'p99_dep_delay': float, 'pct_delayed_15': float,
+        'avg_arr_delay': float, 'n_flights_operated': int
+    })
 
     print(f"Computed delay stats for {len(airport_delays)} airports.")
     return airport_delays
@@ -302,7 +310,7 @@ def main():
     if not os.path.exists(VOLUME_SUMMARY_PATH):
         print(f"ERROR: {VOLUME_SUMMARY_PATH} not found.")
         return
-    if not os.path.exists(DELAYS_DATA_PATH):
+    if not flight_data_exists(DELAYS_DATA_PATH):
         print(f"ERROR: {DELAYS_DATA_PATH} not found.")
         return
 
@@ -436,7 +444,7 @@ def main():
 
     detail_cols = [
         'airport_code', 'name', 'category', 'total_flights',
-        'avg_dep_delay', 'median_dep_delay', 'pct_delayed_15',
+        'avg_dep_delay', 'median_dep_delay', 'p90_dep_delay', 'p99_dep_delay', 'pct_delayed_15',
         'delay_weighted_sentiment', 'delay_reviews_count'
     ]
     existing_cols = [c for c in detail_cols if c in df.columns]
@@ -1,88 +1,146 @@
 import pandas as pd
+import numpy as np
 import os
 import sys
+import argparse
 
 current_script_dir = os.path.dirname(os.path.abspath(__file__))
 src_dir = os.path.dirname(current_script_dir)
 backend_dir = os.path.dirname(src_dir)
+sys.path.append(src_dir)
+
+from utils.flight_store import flight_data_exists, flight_store_exists, store_dir_for, store_months, load_flights
+from utils.delay_cube import load_delay_sketch
+from utils.delay_sketch import sketch_quantiles
 
 INPUT_FILE = os.path.join(backend_dir, 'data', 'processed', 'delays', 'delays_consolidated_filtered.csv')
+OUTPUT_CSV = os.path.join(backend_dir, 'results', 'tables', 'delay_bucket_histogram.csv')
+
+DEFAULT_EDGES = [15, 30, 60]
+MIN_RANKED_FLIGHTS = 100
+
+STATS_COLUMNS = ['SchedDepApt', 'SchedArrApt', 'AirlineCode', 'MinLateDeparted', 'MinLateArrived', 'Cancelled']
+
+# (dimension, direction, grouping column, delay column)
+STATS_GROUPS = [
+    ('airport', 'dep', 'SchedDepApt', 'MinLateDeparted'),
+    ('airport', 'arr', 'SchedArrApt', 'MinLateArrived'),
+    ('airline', 'dep', 'AirlineCode', 'MinLateDeparted'),
+    ('airline', 'arr', 'AirlineCode', 'MinLateArrived'),
+]
+
+def bucket_labels(edges):
+    labels = [f"On Time (<{edges[0]}m)"]
+    labels += [f"Delay {lo}-{hi}m" for lo, hi in zip(edges[:-1], edges[1:])]
+    labels.append(f"Delay >{edges[-1]}m")
+    return labels
+
+def bin_delays(codes, n_groups, minutes, edges):
+    n_bins = len(edges) + 1
+    valid = codes >= 0
+    bins = np.digitize(minutes[valid], edges)
+    flat = codes[valid].astype(np.int64) * n_bins + bins
+    return np.bincount(flat, minlength=n_groups * n_bins).reshape(n_groups, n_bins)
+
+def iter_flight_months(file_path):
+    store_dir = store_dir_for(file_path)
+    if not flight_store_exists(store_dir):
+        yield load_flights(STATS_COLUMNS, csv_path=file_path, report=False)
+        return
+    for month in store_months(store_dir):
+        yield load_flights(STATS_COLUMNS, csv_path=file_path, months=[month], report=False)
+
+def collect_delay_histograms(file_path, edges):
+    labels = bucket_labels(edges)
+    histograms = {(dimension, direction): None for dimension, direction, _, _ in STATS_GROUPS}
+    totals = {'flights': 0, 'cancelled': 0}
+
+    for flights in iter_flight_months(file_path):
+        cancelled = flights['Cancelled'].to_numpy(bool)
+        totals['flights'] += len(flights)
+        totals['cancelled'] += int(cancelled.sum())
+        operated = flights[~cancelled]
 
-def analyze_delays(file_path):
+        for dimension, direction, group_col, delay_col in STATS_GROUPS:
+            groups = operated[group_col]
+            minutes = operated[delay_col].fillna(0).to_numpy(np.int64)
+            counts = bin_delays(groups.cat.codes.to_numpy(), len(groups.cat.categories), minutes, edges)
+            month_hist = pd.DataFrame(counts, index=groups.cat.categories.astype(str), columns=labels)
+
+            key = (dimension, direction)
+            histograms[key] = month_hist if histograms[key] is None else histograms[key].add(month_hist, fill_value=0)
+
+    histograms = {key: hist.astype(np.int64) for key, hist in histograms.items() if hist is not None}
+    return histograms, totals
+
+def punctuality_ranking(hist, index_name):
+    flights = hist.sum(axis=1)
+    ranking = pd.DataFrame({
+        'Flights': flights,
+        'OnTimePct': hist.iloc[:, 0] / flights.where(flights > 0) * 100
+    })
+    ranking.index.name = index_name
+    return ranking[ranking['Flights'] > MIN_RANKED_FLIGHTS].sort_values('OnTimePct', ascending=False)
+
+def save_histograms(histograms, output_csv):
+    rows = []
+    for (dimension, direction), hist in histograms.items():
+        long = hist.rename_axis('key').reset_index().melt(id_vars='key', var_name='bucket', value_name='flights')
+        rows.append(long.assign(dimension=dimension, direction=direction))
+    df_out = pd.concat(rows, ignore_index=True)[['dimension', 'direction', 'key', 'bucket', 'flights']]
+    os.makedirs(os.path.dirname(output_csv), exist_ok=True)
+    df_out.to_csv(output_csv, index=False)
+
+def analyze_delays(file_path, edges=DEFAULT_EDGES):
     print(f"Loading data from {file_path}...")
-    try:
-        df = pd.read_csv(file_path, low_memory=False)
-    except FileNotFoundError:
+    if not flight_data_exists(file_path):
         print(f"Error: File not found at {file_path}")
         return
+    edges = sorted(edges)
+    histograms, totals = collect_delay_histograms(file_path, edges)
 
-    total_flights = len(df)
+    total_flights = totals['flights']
     print(f"\n--- General Stats ---")
     print(f"Total Flights (Scheduled): {total_flights}")
 
-    if 'Cancelled' in df.columns:
-        cancelled_numeric = pd.to_numeric(df['Cancelled'], errors='coerce').fillna(0)
-        df_operated = df[cancelled_numeric == 0].copy()
-        cancelled_count = total_flights - len(df_operated)
-        print(f"Cancelled Flights: {cancelled_count} ({cancelled_count/total_flights*100:.2f}%)")
-    else:
-        df_operated = df.copy()
-        print("Warning: 'Cancelled' column not found. Assuming all flights operated.")
-
-    print(f"Operated Flights: {len(df_operated)}")
-
-    if 'MinLateDeparted' not in df_operated.columns or 'MinLateArrived' not in df_operated.columns:
-        print("Error: Delay columns 'MinLateDeparted' or 'MinLateArrived' not found.")
+    cancelled_count = totals['cancelled']
+    operated = total_flights - cancelled_count
+    print(f"Cancelled Flights: {cancelled_count} ({cancelled_count/max(total_flights, 1)*100:.2f}%)")
+    print(f"Operated Flights: {operated}")
+    if total_flights == 0:
         return
 
-    df_operated['MinLateDeparted'] = pd.to_numeric(df_operated['MinLateDeparted'], errors='coerce').fillna(0)
-    df_operated['MinLateArrived'] = pd.to_numeric(df_operated['MinLateArrived'], errors='coerce').fillna(0)
-
-    def get_delay_buckets(series):
-        total = len(series)
-        if total == 0:
-            return {}
-        on_time = (series < 15).sum()
-        delay_15_30 = ((series >= 15) & (series < 30)).sum()
-        delay_30_60 = ((series >= 30) & (series < 60)).sum()
-        delay_60_plus = (series >= 60).sum()
-        
-        return {
-            'On Time (<15m)': (on_time, on_time/total*100),
-            'Delay 15-30m': (delay_15_30, delay_15_30/total*100),
-            'Delay 30-60m': (delay_30_60, delay_30_60/total*100),
-            'Delay >60m': (delay_60_plus, delay_60_plus/total*100)
-        }
-
-    print("\n--- Departure Delay Stats (Operated Flights) ---")
-    dep_stats = get_delay_buckets(df_operated['MinLateDeparted'])
-    for bucket, (count, pct) in dep_stats.items():
-        print(f"{bucket}: {count} ({pct:.2f}%)")
-
-    print("\n--- Arrival Delay Stats (Operated Flights) ---")
-    arr_stats = get_delay_buckets(df_operated['MinLateArrived'])
-    for bucket, (count, pct) in arr_stats.items():
-        print(f"{bucket}: {count} ({pct:.2f}%)")
+    for direction, label in [('dep', 'Departure'), ('arr', 'Arrival')]:
+        print(f"\n--- {label} Delay Stats (Operated Flights) ---")
+        network = histograms[('airport', direction)].sum(axis=0)
+        for bucket, count in network.items():
+            print(f"{bucket}: {count} ({count/max(operated, 1)*100:.2f}%)")
+
+    print("\n--- Delay Percentiles (Operated Flights) ---")
+    sketch = load_delay_sketch(file_path)
+    percentiles = sketch_quantiles(sketch, ['direction'])
+    for _, row in percentiles.iterrows():
+        label = 'Departure' if row['direction'] == 'dep' else 'Arrival'
+        print(f"{label}: p50 {row['p50']:.1f} min, p90 {row['p90']:.1f} min, p99 {row['p99']:.1f} min")
 
     print("\n--- Punctuality Rankings ---")
 
-    print("\nTop 10 Most Punctual Airports (Departures):")
-    if 'SchedDepApt' in df_operated.columns:
-        apt_dep_stats = df_operated.groupby('SchedDepApt')['MinLateDeparted'].agg(['count', lambda x: (x < 15).mean() * 100])
-        apt_dep_stats.columns = ['Flights', 'OnTimePct']
-        apt_dep_stats = apt_dep_stats[apt_dep_stats['Flights'] > 100].sort_values('OnTimePct', ascending=False)
-        print(apt_dep_stats.head(10).to_string(formatters={'OnTimePct': '{:.2f}%'.format}))
-    else:
-        print("Column 'SchedDepApt' not found.")
-
-    print("\nTop 10 Most Punctual Airports (Arrivals):")
-    if 'SchedArrApt' in df_operated.columns:
-        apt_arr_stats = df_operated.groupby('SchedArrApt')['MinLateArrived'].agg(['count', lambda x: (x < 15).mean() * 100])
-        apt_arr_stats.columns = ['Flights', 'OnTimePct']
-        apt_arr_stats = apt_arr_stats[apt_arr_stats['Flights'] > 100].sort_values('OnTimePct', ascending=False)
-        print(apt_arr_stats.head(10).to_string(formatters={'OnTimePct': '{:.2f}%'.format}))
-    else:
-        print("Column 'SchedArrApt' not found.")
+    rankings = [
+        ('airport', 'dep', 'Airports (Departures)', 'SchedDepApt'),
+        ('airport', 'arr', 'Airports (Arrivals)', 'SchedArrApt'),
+        ('airline', 'arr', 'Airlines (Arrivals)', 'AirlineCode'),
+    ]
+    for dimension, direction, title, index_name in rankings:
+        print(f"\nTop 10 Most Punctual {title}:")
+        ranking = punctuality_ranking(histograms[(dimension, direction)], index_name)
+        print(ranking.head(10).to_string(formatters={'OnTimePct': '{:.2f}%'.format}))
+
+    save_histograms(histograms, OUTPUT_CSV)
+    print(f"\nSaved delay bucket histograms to: {OUTPUT_CSV}")
 
 if __name__ == "__main__":
-    analyze_delays(INPUT_FILE)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Delay bucket statistics and punctuality rankings.")
+    parser.add_argument('--edges', nargs='+', type=int, default=DEFAULT_EDGES,
+                        help="delay bucket edges in minutes; the first edge is the on-time threshold")
+    args = parser.parse_args()
+    analyze_delays(INPUT_FILE, args.edges)
@@ -1,10 +1,15 @@
 import pandas as pd
 import os
 import numpy as np
+import sys
 
 current_script_dir = os.path.dirname(os.path.abspath(__file__))
 src_dir = os.path.dirname(current_script_dir)
 backend_dir = os.path.dirname(src_dir)
+sys.path.append(src_dir)
+
+from utils.flight_store import flight_data_exists
+from utils.delay_cube import load_delay_cube, rollup
 
 SENTIMENT_SUMMARY_PATH = os.path.join(backend_dir, 'results', 'tables', 'airport_analysis_summary.csv')
 DELAYS_DATA_PATH = os.path.join(backend_dir, 'data', 'processed', 'delays', 'delays_consolidated_filtered.csv')
@@ -23,18 +28,16 @@ def main():
     df_sentiment = pd.read_csv(SENTIMENT_SUMMARY_PATH)
     
     print(f"Loading flight data from: {DELAYS_DATA_PATH}")
-    if not os.path.exists(DELAYS_DATA_PATH):
+    if not flight_data_exists(DELAYS_DATA_PATH):
         print(f"ERROR: File {DELAYS_DATA_PATH} not found.")
         return
     
-    df_flights = pd.read_csv(DELAYS_DATA_PATH, usecols=['SchedDepApt', 'SchedArrApt'], low_memory=False)
+    cube = load_delay_cube(DELAYS_DATA_PATH)
 
     print("Calculating flight volumes...")
-    dep_counts = df_flights['SchedDepApt'].value_counts()
-    arr_counts = df_flights['SchedArrApt'].value_counts()
-    
-    total_volumes = dep_counts.add(arr_counts, fill_value=0).reset_index()
+    total_volumes = rollup(cube, ['airport'])[['airport', 'n_flights']]
     total_volumes.columns = ['airport_code', 'total_flights']
+    total_volumes['airport_code'] = total_volumes['airport_code'].astype(str)
     
     df_merged = df_sentiment.merge(total_volumes, on='airport_code', how='left')
     df_merged['total_flights'] = df_merged['total_flights'].fillna(0)
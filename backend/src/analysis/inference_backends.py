@@ -0,0 +1,90 @@
+import os
+from types import SimpleNamespace
+import numpy as np
+
+CURRENT_FILE = os.path.abspath(__file__)
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(CURRENT_FILE)))
+ONNX_CACHE_DIR = os.environ.get("SENTIMENT_ONNX_DIR", os.path.join(BASE_DIR, 'data', 'cache', 'onnx'))
+
+BACKENDS = ['torch', 'int8', 'onnx']
+ONNX_OPSET = 14
+
+class OnnxSequenceClassifier:
+    def __init__(self, onnx_path, config, input_names, num_threads=None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+
+        self.session = ort.InferenceSession(onnx_path, sess_options=options, providers=['CPUExecutionProvider'])
+        self.config = config
+        self.input_names = input_names
+
+    def eval(self):
+        return self
+
+    def __call__(self, **inputs):
+        import torch
+
+        feed = {name: inputs[name].cpu().numpy().astype(np.int64) for name in self.input_names}
+        logits = self.session.run(['logits'], feed)[0]
+        return SimpleNamespace(logits=torch.from_numpy(logits))
+
+def onnx_model_path(model_name, revision):
+    return os.path.join(ONNX_CACHE_DIR, f"{model_name.replace('/', '__')}@{revision}.onnx")
+
+def export_onnx(model, tokenizer, onnx_path):
+    import torch
+
+    class LogitsOnly(torch.nn.Module):
+        def __init__(self, inner, input_names):
+            super().__init__()
+            self.inner = inner
+            self.input_names = input_names
+
+        def forward(self, *args):
+            return self.inner(**dict(zip(self.input_names, args))).logits
+
+    input_names = list(tokenizer.model_input_names)
+    sample = tokenizer(["onnx export sample"], return_tensors="pt")
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names}
+    dynamic_axes['logits'] = {0: 'batch'}
+
+    os.makedirs(os.path.dirname(onnx_path), exist_ok=True)
+    tmp_path = os.path.join(os.path.dirname(onnx_path), f".{os.path.basename(onnx_path)}.{os.getpid()}.tmp")
+    print(f"Exporting ONNX graph to {onnx_path}...")
+    try:
+        torch.onnx.export(
+            LogitsOnly(model, input_names).eval(),
+            tuple(sample[name] for name in input_names),
+            tmp_path,
+            input_names=input_names,
+            output_names=['logits'],
+            dynamic_axes=dynamic_axes,
+            opset_version=ONNX_OPSET
+        )
+        os.replace(tmp_path, onnx_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return input_names
+
+def build_backend_model(model_name, tokenizer, model, backend, revision='unknown'):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}'. Choose from: {', '.join(BACKENDS)}")
+
+    if backend == 'torch':
+        return model
+
+    import torch
+
+    if backend == 'int8':
+        return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8).eval()
+
+    onnx_path = onnx_model_path(model_name, revision)
+    input_names = list(tokenizer.model_input_names)
+    if not os.path.exists(onnx_path):
+        input_names = export_onnx(model, tokenizer, onnx_path)
+    return OnnxSequenceClassifier(onnx_path, model.config, input_names, num_threads=torch.get_num_threads())
@@ -1,8 +1,16 @@
 import pandas as pd
-import glob
 import os
+import sys
+import argparse
 from pathlib import Path
 
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from utils.flight_store import load_flights, write_month_dataset
+from utils.weather_join import WeatherIndex, attach_weather
+
+WEATHER_COLUMNS = ['temp', 'wspd', 'prcp', 'pres']
+MATCH_TOLERANCE_MINUTES = int(os.environ.get("WEATHER_MATCH_TOLERANCE_MINUTES", 90))
+
 def load_airports_mapping(airports_file):
     print(f"Loading airport mapping from {airports_file}...")
     df = pd.read_csv(airports_file)
@@ -13,101 +21,47 @@ def load_airports_mapping(airports_file):
     print(f"Loaded {len(mapping)} airport mappings.")
     return mapping
 
-def load_weather_data(weather_dir):
-    print(f"Loading weather data from {weather_dir}...")
-    weather_files = glob.glob(os.path.join(weather_dir, "*.parquet"))
-    
-    weather_dfs = []
-    for f in weather_files:
-        icao = Path(f).stem
-        try:
-            df = pd.read_parquet(f)
-            if 'time' in df.columns:
-                df['time'] = pd.to_datetime(df['time'])
-                df = df.set_index('time')
-            elif not isinstance(df.index, pd.DatetimeIndex):
-                 df.index = pd.to_datetime(df.index)
-            
-            df['ICAO'] = icao
-            weather_dfs.append(df)
-        except Exception as e:
-            print(f"Error loading {f}: {e}")
-
-    if not weather_dfs:
-        raise ValueError("No weather data loaded.")
-
-    combined_weather = pd.concat(weather_dfs)
-    combined_weather = combined_weather.reset_index()
-    
-    if 'index' in combined_weather.columns and 'time' not in combined_weather.columns:
-        combined_weather.rename(columns={'index': 'time'}, inplace=True)
-
-    if combined_weather['time'].dt.tz is not None:
-        combined_weather['time'] = combined_weather['time'].dt.tz_convert(None)
-
-    print(f"Loaded consolidated weather data with {len(combined_weather)} records.")
-    return combined_weather
-
-def merge_data(flights_file, airports_file, weather_dir, output_file):
+def merge_data(flights_file, airports_file, weather_dir, output_dir, tolerance_minutes=MATCH_TOLERANCE_MINUTES):
     iata_to_icao = load_airports_mapping(airports_file)
 
     print(f"Loading flight data from {flights_file}...")
-    flights = pd.read_csv(flights_file, low_memory=False)
+    flights = load_flights(csv_path=flights_file)
     print(f"Loaded {len(flights)} flights.")
     
-    flights['SchedDepUtc'] = pd.to_datetime(flights['SchedDepUtc'], utc=True)
-    flights['SchedArrUtc'] = pd.to_datetime(flights['SchedArrUtc'], utc=True)
-
-    flights['DepHour'] = flights['SchedDepUtc'].dt.round('h').dt.tz_localize(None)
-    flights['ArrHour'] = flights['SchedArrUtc'].dt.round('h').dt.tz_localize(None)
-
-    flights['DepICAO'] = flights['SchedDepApt'].map(iata_to_icao)
-    flights['ArrICAO'] = flights['SchedArrApt'].map(iata_to_icao)
-
-    weather_df = load_weather_data(weather_dir)
+    flights['DepICAO'] = flights['SchedDepApt'].astype(str).map(iata_to_icao)
+    flights['ArrICAO'] = flights['SchedArrApt'].astype(str).map(iata_to_icao)
+
+    tolerance = pd.Timedelta(minutes=tolerance_minutes)
+    window_start = min(flights['SchedDepUtc'].min(), flights['SchedArrUtc'].min()) - tolerance
+    window_end = max(flights['SchedDepUtc'].max(), flights['SchedArrUtc'].max()) + tolerance
+    print(f"Loading weather {WEATHER_COLUMNS} from {weather_dir} for {window_start} to {window_end}...")
+    weather_index = WeatherIndex.from_directory(weather_dir, columns=WEATHER_COLUMNS, start=window_start, end=window_end)
     
-    print("Merging departure weather...")
-    dep_weather = weather_df.copy()
-    dep_weather.columns = ['Dep_' + col if col not in ['ICAO', 'time'] else col for col in dep_weather.columns]
-    
-    flights = pd.merge(
-        flights,
-        dep_weather,
-        left_on=['DepICAO', 'DepHour'],
-        right_on=['ICAO', 'time'],
-        how='left',
-        suffixes=('', '_dep_weather_dup')
-    )
-    flights.drop(columns=['ICAO', 'time'], inplace=True, errors='ignore')
-
-    print("Merging arrival weather...")
-    arr_weather = weather_df.copy()
-    arr_weather.columns = ['Arr_' + col if col not in ['ICAO', 'time'] else col for col in arr_weather.columns]
+    print(f"Joining departure weather (nearest observation within {tolerance_minutes} min)...")
+    dep_stats = attach_weather(flights, weather_index, 'SchedDepApt', 'SchedDepUtc', 'Dep', iata_to_icao, tolerance)
 
-    flights = pd.merge(
-        flights,
-        arr_weather,
-        left_on=['ArrICAO', 'ArrHour'],
-        right_on=['ICAO', 'time'],
-        how='left',
-        suffixes=('', '_arr_weather_dup')
-    )
-    flights.drop(columns=['ICAO', 'time'], inplace=True, errors='ignore')
+    print(f"Joining arrival weather (nearest observation within {tolerance_minutes} min)...")
+    arr_stats = attach_weather(flights, weather_index, 'SchedArrApt', 'SchedArrUtc', 'Arr', iata_to_icao, tolerance)
     
-    print(f"Saving enriched data to {output_file}...")
-    output_path = Path(output_file)
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    flights.to_csv(output_file, index=False)
-    print("Done.")
+    print(f"Saving enriched data to {output_dir}...")
+    Path(output_dir).parent.mkdir(parents=True, exist_ok=True)
+    months = write_month_dataset(flights, output_dir, time_col='SchedDepUtc')
+    print(f"Done. Wrote {len(months)} monthly partitions.")
 
-    print(f"Flights with Dep Weather: {flights['Dep_temp'].notnull().sum()} / {len(flights)}")
-    print(f"Flights with Arr Weather: {flights['Arr_temp'].notnull().sum()} / {len(flights)}")
+    for label, stats in [('Dep', dep_stats), ('Arr', arr_stats)]:
+        print(f"Flights with {label} Weather: {stats['matched']} / {len(flights)} "
+              f"({stats['match_rate'] * 100:.2f}% matched, mean offset {stats['mean_offset_min']:.1f} min)")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Attach nearest hourly weather observations to flights.")
+    parser.add_argument('--tolerance-minutes', type=int, default=MATCH_TOLERANCE_MINUTES,
+                        help="maximum distance between a flight and the weather observation used for it")
+    args = parser.parse_args()
+
     BASE_DIR = Path(__file__).resolve().parents[3]
     AIRPORTS_FILE = BASE_DIR / "backend" / "data" / "processed" / "airports" / "airports_filtered.csv"
     FLIGHTS_FILE = BASE_DIR / "backend" / "data" / "processed" / "delays" / "delays_consolidated_filtered.csv"
     WEATHER_DIR = BASE_DIR / "backend" / "data" / "raw" / "weather"
-    OUTPUT_FILE = BASE_DIR / "backend" / "data" / "merged" / "flights_with_weather.csv"
+    OUTPUT_DIR = BASE_DIR / "backend" / "data" / "merged" / "flights_with_weather"
 
-    merge_data(FLIGHTS_FILE, AIRPORTS_FILE, WEATHER_DIR, OUTPUT_FILE)
\ No newline at end of file
+    merge_data(FLIGHTS_FILE, AIRPORTS_FILE, WEATHER_DIR, OUTPUT_DIR, args.tolerance_minutes)
\ No newline at end of file
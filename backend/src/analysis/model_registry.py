@@ -0,0 +1,65 @@
+import os
+import sys
+import threading
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from inference_backends import BACKENDS, build_backend_model
+
+HF_TOKEN = os.environ.get("HF_TOKEN")
+INFERENCE_BACKEND = os.environ.get("SENTIMENT_BACKEND", "torch")
+
+_models = {}
+_revisions = {}
+_lock = threading.Lock()
+
+def set_backend(backend):
+    global INFERENCE_BACKEND
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}'. Choose from: {', '.join(BACKENDS)}")
+    INFERENCE_BACKEND = backend
+
+def _silence_transformers():
+    from transformers import logging as hf_logging
+    hf_logging.set_verbosity_error()
+
+def get_model(model_name, backend=None):
+    backend = backend or INFERENCE_BACKEND
+    key = (model_name, backend)
+    if key in _models:
+        return _models[key]
+
+    with _lock:
+        if key not in _models:
+            from transformers import AutoTokenizer, AutoModelForSequenceClassification
+            _silence_transformers()
+
+            print(f"Loading model: {model_name} (backend: {backend})")
+            tokenizer = AutoTokenizer.from_pretrained(model_name, token=HF_TOKEN)
+            model = AutoModelForSequenceClassification.from_pretrained(model_name, token=HF_TOKEN)
+            model.eval()
+            revision = get_model_revision(model_name, backend='torch')
+            _models[key] = (tokenizer, build_backend_model(model_name, tokenizer, model, backend, revision))
+
+    return _models[key]
+
+def get_model_revision(model_name, backend=None):
+    backend = backend or INFERENCE_BACKEND
+
+    if model_name not in _revisions:
+        from transformers import AutoConfig
+        _silence_transformers()
+        config = AutoConfig.from_pretrained(model_name, token=HF_TOKEN)
+        _revisions[model_name] = getattr(config, '_commit_hash', None) or 'unknown'
+
+    revision = _revisions[model_name]
+    if backend != 'torch':
+        revision = f"{revision}+{backend}"
+    return revision
+
+def loaded_models():
+    return list(_models.keys())
+
+def unload_all():
+    with _lock:
+        _models.clear()
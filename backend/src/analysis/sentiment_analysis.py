@@ -1,16 +1,21 @@
 import pandas as pd
 import os
-import json
-import torch
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
+import sys
 import numpy as np
-from datetime import datetime
-import re
-from tqdm import tqdm
-import logging
-from transformers import logging as hf_logging
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 
-hf_logging.set_verbosity_error()
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sentiment_engine import score_texts, score_texts_with_uncertainty, TOKEN_BUDGET, MAX_BATCH_SIZE
+from sentiment_cache import get_score_cache, score_with_cache, score_with_uncertainty_cache
+from sentiment_checkpoint import ChunkCheckpoint, iter_parts
+from utils.flight_store import flight_data_exists
+from utils.delay_cube import load_delay_cube, rollup
+from utils.keyword_tagger import KeywordTagger, load_keyword_groups, tag_keyword_columns
+from model_registry import get_model, get_model_revision, set_backend, BACKENDS, INFERENCE_BACKEND
 
 CURRENT_FILE = os.path.abspath(__file__)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(CURRENT_FILE)))
@@ -19,20 +24,11 @@ CONFIG_PATH = os.path.join(BASE_DIR, 'config', 'keywords.json')
 INPUT_FILE = os.path.join(DATA_DIR, 'merged', 'combined_data.csv')
 AIRPORTS_PATH = os.path.join(DATA_DIR, 'processed', 'airports', 'airports_filtered.csv')
 FLIGHTS_DATA_PATH = os.path.join(DATA_DIR, 'processed', 'delays', 'delays_consolidated_filtered.csv')
+PARTS_DIR = os.path.join(DATA_DIR, 'sentiment', 'parts')
 
 MODEL_A_NAME = "nlptown/bert-base-multilingual-uncased-sentiment"
 MODEL_B_NAME = "cardiffnlp/twitter-xlm-roberta-base-sentiment"
 
-HF_TOKEN = os.environ.get("HF_TOKEN")
-
-print(f"Loading Model A: {MODEL_A_NAME}")
-tokenizer_a = AutoTokenizer.from_pretrained(MODEL_A_NAME, token=HF_TOKEN)
-model_a = AutoModelForSequenceClassification.from_pretrained(MODEL_A_NAME, token=HF_TOKEN)
-
-print(f"Loading Model B: {MODEL_B_NAME}")
-tokenizer_b = AutoTokenizer.from_pretrained(MODEL_B_NAME, token=HF_TOKEN)
-model_b = AutoModelForSequenceClassification.from_pretrained(MODEL_B_NAME, token=HF_TOKEN)
-
 def get_icao_to_iata_mapping(csv_path):
     if not os.path.exists(csv_path):
         return {}
@@ -43,18 +39,13 @@ def get_icao_to_iata_mapping(csv_path):
 def get_dynamic_strategic_hubs(flights_path, airports_path, top_n=35):
     print(f"Calculating Strategic Hubs dynamically from: {flights_path}")
     
-    if not os.path.exists(flights_path):
+    if not flight_data_exists(flights_path):
         print("[WARNING] Flights data not found. Falling back to empty hub list.")
         return []
 
     try:
-        cols_to_use = ['SchedDepApt', 'SchedArrApt']
-        df_flights = pd.read_csv(flights_path, usecols=cols_to_use)
-
-        dep_counts = df_flights['SchedDepApt'].value_counts()
-        arr_counts = df_flights['SchedArrApt'].value_counts()
-        
-        total_movements = dep_counts.add(arr_counts, fill_value=0)
+        cube = load_delay_cube(flights_path)
+        total_movements = rollup(cube, ['airport']).set_index('airport')['n_flights']
         top_iata_list = total_movements.sort_values(ascending=False).head(top_n).index.tolist()
         top_iata_list = [str(x).strip().upper() for x in top_iata_list if pd.notna(x)]
         
@@ -64,34 +55,69 @@ def get_dynamic_strategic_hubs(flights_path, airports_path, top_n=35):
         print(f"[ERROR] Error calculating dynamic hubs: {e}")
         return []
 
+MODEL_A_WEIGHTS = [1.0, 3.25, 5.5, 7.75, 10.0]
+MODEL_B_WEIGHTS = [1.0, 5.5, 10.0]
+
+def score_with_model(texts, model_name, weights):
+    cache = get_score_cache()
+    revision = get_model_revision(model_name) if cache is not None else None
+    return score_with_cache(
+        texts, model_name, revision,
+        lambda batch: score_texts(batch, *get_model(model_name), weights),
+        cache=cache
+    )
+
+def calculate_bert_sentiment_a_batch(texts):
+    return score_with_model(texts, MODEL_A_NAME, MODEL_A_WEIGHTS)
+
+def calculate_roberta_sentiment_b_batch(texts):
+    return score_with_model(texts, MODEL_B_NAME, MODEL_B_WEIGHTS)
+
+def calculate_ensemble_sentiment_batch(texts):
+    texts = list(texts)
+    scores_a = calculate_bert_sentiment_a_batch(texts)
+    scores_b = calculate_roberta_sentiment_b_batch(texts)
+
+    final_scores = (scores_a + scores_b) / 2
+
+    return final_scores, scores_a, scores_b
+
+CASCADE_METRICS = ['entropy', 'margin']
+CASCADE_DEFAULT_THRESHOLDS = {'entropy': 0.6, 'margin': 0.4}
+
+def is_uncertain(entropy, margin, metric, threshold):
+    if metric == 'entropy':
+        return entropy > threshold
+    return margin < threshold
+
+def calculate_cascade_sentiment_batch(texts, metric='entropy', threshold=None):
+    texts = list(texts)
+    if threshold is None:
+        threshold = CASCADE_DEFAULT_THRESHOLDS[metric]
+
+    cache = get_score_cache()
+    revision = get_model_revision(MODEL_A_NAME) if cache is not None else None
+    scores_a, entropy, margin = score_with_uncertainty_cache(
+        texts, MODEL_A_NAME, revision,
+        lambda batch: score_texts_with_uncertainty(batch, *get_model(MODEL_A_NAME), MODEL_A_WEIGHTS),
+        cache=cache
+    )
+    uncertain = is_uncertain(entropy, margin, metric, threshold)
+
+    scores_b = np.full(len(texts), np.nan, dtype=np.float64)
+    uncertain_idx = np.flatnonzero(uncertain)
+    if len(uncertain_idx) > 0:
+        scores_b[uncertain_idx] = calculate_roberta_sentiment_b_batch([texts[i] for i in uncertain_idx])
+
+    final_scores = np.where(uncertain, (scores_a + scores_b) / 2, scores_a)
+
+    return final_scores, scores_a, scores_b, ~uncertain
+
 def calculate_bert_sentiment_a(text):
-    if not text or pd.isna(text):
-        return 5.5
-    
-    inputs = tokenizer_a(str(text), return_tensors="pt", truncation=True, padding=True, max_length=512)
-    with torch.no_grad():
-        outputs = model_a(**inputs)
-    
-    probs = torch.nn.functional.softmax(outputs.logits, dim=-1)
-    probs_np = probs.cpu().numpy()[0]
-    
-    weights = [1.0, 3.25, 5.5, 7.75, 10.0]
-    score_10 = sum(weights[i] * p for i, p in enumerate(probs_np))
-    return score_10
+    return calculate_bert_sentiment_a_batch([text])[0]
 
 def calculate_roberta_sentiment_b(text):
-    if not text or pd.isna(text):
-        return 5.5
-    
-    inputs = tokenizer_b(str(text), return_tensors="pt", truncation=True, padding=True, max_length=512)
-    with torch.no_grad():
-        outputs = model_b(**inputs)
-    
-    probs = torch.nn.functional.softmax(outputs.logits, dim=-1)
-    probs_np = probs.cpu().numpy()[0]
-    
-    score_10 = (probs_np[0] * 1.0) + (probs_np[1] * 5.5) + (probs_np[2] * 10.0)
-    return score_10
+    return calculate_roberta_sentiment_b_batch([text])[0]
 
 def calculate_ensemble_sentiment(text):
     score_a = calculate_bert_sentiment_a(text)
@@ -101,73 +127,168 @@ def calculate_ensemble_sentiment(text):
     
     return final_score, score_a, score_b
 
-def process_dataset(df, mode, strategic_hubs, keywords=None):
-    print(f"\n--- Processing Mode: {mode.upper()} ---")
-    
-    df_subset = df.copy()
-    
-    if keywords:
-        pattern = '|'.join(map(re.escape, keywords))
-        df_subset = df_subset[df_subset['text'].str.contains(pattern, case=False, na=False)]
-        print(f"Filtered rows: {len(df_subset)}")
+SCORE_COLUMNS = ['model_a_score', 'model_b_score', 'combined_score', 'cascade_fast_path']
+
+SENTIMENT_WORKERS = int(os.environ.get("SENTIMENT_WORKERS", 1))
+CHUNK_SIZE = int(os.environ.get("SENTIMENT_CHUNK_SIZE", 5000))
+SHARDS_PER_WORKER = 4
+
+def init_worker(num_threads, backend):
+    import torch
+    torch.set_num_threads(num_threads)
+    set_backend(backend)
+    get_model(MODEL_A_NAME)
+    get_model(MODEL_B_NAME)
+
+def score_shard(texts, cascade=None):
+    cache = get_score_cache()
+    hits_before, misses_before = (cache.hits, cache.misses) if cache is not None else (0, 0)
+
+    if cascade:
+        combined, scores_a, scores_b, fast_path = calculate_cascade_sentiment_batch(texts, **cascade)
+        result = {'model_a_score': scores_a, 'model_b_score': scores_b, 'combined_score': combined,
+                  'cascade_fast_path': fast_path}
     else:
-        print(f"Using full dataset: {len(df_subset)}")
+        combined, scores_a, scores_b = calculate_ensemble_sentiment_batch(texts)
+        result = {'model_a_score': scores_a, 'model_b_score': scores_b, 'combined_score': combined}
 
-    if df_subset.empty:
-        print("No data for this category.")
-        return
+    hits, misses = (cache.hits - hits_before, cache.misses - misses_before) if cache is not None else (0, 0)
+    return result, hits, misses
 
-    results = []
-    print("Calculating Ensemble Sentiment...")
-    
-    for idx, row in tqdm(df_subset.iterrows(), total=len(df_subset)):
-        score_10, score_a, score_b = calculate_ensemble_sentiment(row['text'])
-        
-        results.append({
-            'model_a_score': score_a,
-            'model_b_score': score_b,
-            'combined_score': score_10
-        })
-
-    result_df = pd.DataFrame(results)
-    final_df = pd.concat([df_subset.reset_index(drop=True), result_df], axis=1)
-    
-    output_filename = f"sentiment_results_raw_{mode}.csv"
-    output_path = os.path.join(DATA_DIR, 'sentiment', output_filename)
-    final_df.to_csv(output_path, index=False)
-    print(f"Saved: {output_path}")
+def start_worker_pool(workers, backend):
+    threads_per_worker = max(1, (os.cpu_count() or 1) // workers)
+    print(f"Starting {workers} scoring workers ({threads_per_worker} torch threads each)...")
+
+    ctx = multiprocessing.get_context('spawn')
+    return ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                               initializer=init_worker, initargs=(threads_per_worker, backend))
+
+def score_texts_parallel(texts, executor, workers, cascade=None):
+    num_shards = min(len(texts), workers * SHARDS_PER_WORKER)
+    shards = [list(shard) for shard in np.array_split(np.asarray(texts, dtype=object), num_shards)]
+
+    shard_results = list(executor.map(score_shard, shards, [cascade] * len(shards)))
+
+    result = {col: np.concatenate([r[0][col] for r in shard_results]) for col in shard_results[0][0]}
+    hits = sum(r[1] for r in shard_results)
+    misses = sum(r[2] for r in shard_results)
+    return result, hits, misses
+
+def score_unique_texts(df, executor=None, workers=1, cascade=None):
+    unique_texts = df['text'].drop_duplicates().tolist()
+    print(f"Unique texts to score: {len(unique_texts)} (from {len(df)} rows)")
+
+    if executor is not None and len(unique_texts) > 1:
+        result, hits, misses = score_texts_parallel(unique_texts, executor, workers, cascade)
+    else:
+        result, hits, misses = score_shard(unique_texts, cascade)
+
+    if get_score_cache() is not None:
+        print(f"Score cache: {hits} hits, {misses} misses")
+    if cascade and len(unique_texts) > 0:
+        fast_path = result['cascade_fast_path']
+        print(f"Cascade fast path: {fast_path.sum()} / {len(fast_path)} texts ({fast_path.mean() * 100:.1f}%)")
+
+    return pd.DataFrame({'text': unique_texts, **result})
+
+MODE_CATEGORIES = {
+    'general': None,
+    'delay': 'delays',
+    'noise': 'noise'
+}
+
+def write_mode_outputs(part_paths, tagger, mode_categories=MODE_CATEGORIES):
+    output_dir = os.path.join(DATA_DIR, 'sentiment')
+    tmp_paths = {mode: os.path.join(output_dir, f"sentiment_results_raw_{mode}.csv.tmp") for mode in mode_categories}
+    row_counts = {mode: 0 for mode in mode_categories}
+
+    for path in tmp_paths.values():
+        if os.path.exists(path):
+            os.remove(path)
+
+    for df_part in iter_parts(part_paths):
+        tags = tag_keyword_columns(df_part['text'], tagger)
+        for mode, category in mode_categories.items():
+            df_subset = df_part[tags[f"kw_{category}"].values] if category else df_part
+            if df_subset.empty:
+                continue
+            df_subset.to_csv(tmp_paths[mode], mode='a', header=row_counts[mode] == 0, index=False)
+            row_counts[mode] += len(df_subset)
+
+    for mode, tmp_path in tmp_paths.items():
+        print(f"\n--- Mode: {mode.upper()} ---")
+        if row_counts[mode] == 0:
+            print("No data for this category.")
+            continue
+        output_path = tmp_path[:-len('.tmp')]
+        os.replace(tmp_path, output_path)
+        print(f"Rows: {row_counts[mode]}")
+        print(f"Saved: {output_path}")
 
 def main():
+    parser = argparse.ArgumentParser(description="Ensemble sentiment scoring for the combined dataset.")
+    parser.add_argument('--workers', type=int, default=SENTIMENT_WORKERS,
+                        help="number of worker processes used for model inference")
+    parser.add_argument('--backend', choices=BACKENDS, default=INFERENCE_BACKEND,
+                        help="inference backend: fp32 torch, dynamic int8 torch or ONNX Runtime")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                        help="rows of combined_data.csv scored and checkpointed at a time")
+    parser.add_argument('--restart', action='store_true',
+                        help="ignore existing checkpoints and rescore from the first chunk")
+    parser.add_argument('--cascade', action='store_true',
+                        help="run Model A first and call Model B only for uncertain texts")
+    parser.add_argument('--cascade-metric', choices=CASCADE_METRICS, default='entropy',
+                        help="uncertainty measure of Model A: normalized entropy or top-class margin")
+    parser.add_argument('--cascade-threshold', type=float, default=None,
+                        help="entropy above / margin below this value sends the text to Model B")
+    args = parser.parse_args()
+
+    cascade = None
+    if args.cascade:
+        threshold = args.cascade_threshold
+        if threshold is None:
+            threshold = CASCADE_DEFAULT_THRESHOLDS[args.cascade_metric]
+        cascade = {'metric': args.cascade_metric, 'threshold': threshold}
+
     if not os.path.exists(INPUT_FILE):
         print("Input file not found.")
         return
 
-    print("Loading Data...")
-    df = pd.read_csv(INPUT_FILE)
-    
     mapping = get_icao_to_iata_mapping(AIRPORTS_PATH)
-    if mapping:
-        df['airport_code'] = df['airport_code'].map(mapping).fillna(df['airport_code'])
-    
-    strategic_hubs_list = get_dynamic_strategic_hubs(FLIGHTS_DATA_PATH, AIRPORTS_PATH, top_n=30)
 
-    with open(CONFIG_PATH, 'r') as f:
-        kw_config = json.load(f)
-        
-    delays_kw = []
-    noise_kw = []
-    for lang in kw_config:
-        if 'delays' in kw_config[lang]: delays_kw.extend(kw_config[lang]['delays'])
-        if 'noise' in kw_config[lang]: noise_kw.extend(kw_config[lang]['noise'])
-    
-    delays_kw = list(set(delays_kw))
-    noise_kw = list(set(noise_kw))
+    tagger = KeywordTagger(load_keyword_groups(CONFIG_PATH))
 
-    process_dataset(df, "general", strategic_hubs_list, keywords=None)
-    
-    process_dataset(df, "delay", strategic_hubs_list, keywords=delays_kw)
-    
-    process_dataset(df, "noise", strategic_hubs_list, keywords=noise_kw)
+    set_backend(args.backend)
+    checkpoint = ChunkCheckpoint(PARTS_DIR, INPUT_FILE, args.chunk_size,
+                                 settings={'backend': args.backend, 'cascade': cascade}, restart=args.restart)
+
+    print(f"Calculating Ensemble Sentiment (backend {args.backend}, token budget {TOKEN_BUDGET}, "
+          f"max batch {MAX_BATCH_SIZE}, chunk size {args.chunk_size})...")
+    if cascade:
+        print(f"Cascade mode: Model B only when Model A {cascade['metric']} crosses {cascade['threshold']}")
+    executor = start_worker_pool(args.workers, args.backend) if args.workers > 1 else None
+    try:
+        for chunk_idx, df in enumerate(pd.read_csv(INPUT_FILE, dtype=str, chunksize=args.chunk_size)):
+            if checkpoint.is_done(chunk_idx):
+                print(f"Chunk {chunk_idx}: already scored, skipping.")
+                continue
+
+            print(f"Chunk {chunk_idx}: {len(df)} rows")
+            if mapping:
+                df['airport_code'] = df['airport_code'].map(mapping).fillna(df['airport_code'])
+
+            scores = score_unique_texts(df, executor=executor, workers=args.workers, cascade=cascade)
+            df = df.drop(columns=SCORE_COLUMNS, errors='ignore').reset_index(drop=True)
+            df = df.merge(scores, on='text', how='left', validate='many_to_one')
+
+            checkpoint.commit(chunk_idx, df)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    print(f"Scored {checkpoint.total_rows()} rows in {len(checkpoint.part_paths())} chunks.")
+
+    write_mode_outputs(checkpoint.part_paths(), tagger)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
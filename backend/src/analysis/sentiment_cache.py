@@ -0,0 +1,234 @@
+import os
+import sys
+import time
+import sqlite3
+import hashlib
+import argparse
+import unicodedata
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sentiment_engine import is_blank_text, NEUTRAL_SCORE
+
+CURRENT_FILE = os.path.abspath(__file__)
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(CURRENT_FILE)))
+DEFAULT_CACHE_PATH = os.path.join(BASE_DIR, 'data', 'cache', 'sentiment_scores.sqlite')
+
+CACHE_PATH = os.environ.get("SENTIMENT_CACHE_PATH", DEFAULT_CACHE_PATH)
+CACHE_ENABLED = os.environ.get("SENTIMENT_CACHE", "1") != "0"
+
+SQL_CHUNK_SIZE = 500
+UNCERTAINTY_COLUMNS = ['entropy', 'margin']
+
+def normalize_text(text):
+    text = unicodedata.normalize('NFC', str(text))
+    return ' '.join(text.split())
+
+def text_hash(text):
+    return hashlib.sha256(normalize_text(text).encode('utf-8')).hexdigest()
+
+class SentimentScoreCache:
+    def __init__(self, path=CACHE_PATH):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=60)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS scores ("
+            " model_name TEXT NOT NULL,"
+            " model_revision TEXT NOT NULL,"
+            " text_hash TEXT NOT NULL,"
+            " score REAL NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_used REAL NOT NULL,"
+            " entropy REAL,"
+            " margin REAL,"
+            " PRIMARY KEY (model_name, model_revision, text_hash))"
+        )
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(scores)")}
+        for col in UNCERTAINTY_COLUMNS:
+            if col not in columns:
+                self.conn.execute(f"ALTER TABLE scores ADD COLUMN {col} REAL")
+        self.conn.commit()
+
+    def get_many(self, model_name, model_revision, hashes, with_uncertainty=False):
+        found = {}
+        unique_hashes = list(dict.fromkeys(hashes))
+        select = "text_hash, score, entropy, margin" if with_uncertainty else "text_hash, score"
+        condition = " AND entropy IS NOT NULL AND margin IS NOT NULL" if with_uncertainty else ""
+        for start in range(0, len(unique_hashes), SQL_CHUNK_SIZE):
+            chunk = unique_hashes[start:start + SQL_CHUNK_SIZE]
+            placeholders = ','.join('?' * len(chunk))
+            rows = self.conn.execute(
+                f"SELECT {select} FROM scores"
+                f" WHERE model_name = ? AND model_revision = ? AND text_hash IN ({placeholders}){condition}",
+                [model_name, model_revision] + chunk
+            ).fetchall()
+            found.update((row[0], row[1:] if with_uncertainty else row[1]) for row in rows)
+
+        if found:
+            now = time.time()
+            self.conn.executemany(
+                "UPDATE scores SET last_used = ? WHERE model_name = ? AND model_revision = ? AND text_hash = ?",
+                [(now, model_name, model_revision, h) for h in found]
+            )
+            self.conn.commit()
+
+        self.hits += sum(1 for h in hashes if h in found)
+        self.misses += sum(1 for h in hashes if h not in found)
+        return found
+
+    def put_many(self, model_name, model_revision, hashes, scores, entropy=None, margin=None):
+        now = time.time()
+        entropy = [None] * len(hashes) if entropy is None else [float(e) for e in entropy]
+        margin = [None] * len(hashes) if margin is None else [float(m) for m in margin]
+        # Keep uncertainty stored by the cascade when a plain scoring pass rewrites the same text.
+        self.conn.executemany(
+            "INSERT INTO scores (model_name, model_revision, text_hash, score, created_at, last_used, entropy, margin)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT (model_name, model_revision, text_hash) DO UPDATE SET"
+            " score = excluded.score, last_used = excluded.last_used,"
+            " entropy = COALESCE(excluded.entropy, scores.entropy),"
+            " margin = COALESCE(excluded.margin, scores.margin)",
+            [(model_name, model_revision, h, float(s), now, now, e, m)
+             for h, s, e, m in zip(hashes, scores, entropy, margin)]
+        )
+        self.conn.commit()
+
+    def stats(self):
+        rows = self.conn.execute(
+            "SELECT model_name, model_revision, COUNT(*), MIN(created_at), MAX(last_used)"
+            " FROM scores GROUP BY model_name, model_revision ORDER BY model_name, model_revision"
+        ).fetchall()
+        return rows
+
+    def evict(self, older_than_days):
+        cutoff = time.time() - older_than_days * 86400
+        deleted = self.conn.execute("DELETE FROM scores WHERE last_used < ?", (cutoff,)).rowcount
+        self.conn.commit()
+        return deleted
+
+    def clear(self):
+        deleted = self.conn.execute("DELETE FROM scores").rowcount
+        self.conn.commit()
+        return deleted
+
+    def compact(self):
+        self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self.conn.execute("VACUUM")
+
+    def close(self):
+        self.conn.close()
+
+_score_cache = None
+
+def get_score_cache():
+    global _score_cache
+    if not CACHE_ENABLED:
+        return None
+    if _score_cache is None:
+        _score_cache = SentimentScoreCache(CACHE_PATH)
+    return _score_cache
+
+def score_with_cache(texts, model_name, model_revision, score_fn, cache=None):
+    texts = list(texts)
+    if cache is None:
+        return score_fn(texts)
+
+    scores = np.full(len(texts), np.nan, dtype=np.float64)
+    valid_idx = [i for i, t in enumerate(texts) if not is_blank_text(t)]
+    blank_idx = [i for i, t in enumerate(texts) if is_blank_text(t)]
+    scores[blank_idx] = NEUTRAL_SCORE
+
+    hashes = [text_hash(texts[i]) for i in valid_idx]
+    found = cache.get_many(model_name, model_revision, hashes)
+
+    missing = {}
+    for i, h in zip(valid_idx, hashes):
+        if h in found:
+            scores[i] = found[h]
+        else:
+            missing.setdefault(h, []).append(i)
+
+    if missing:
+        first_idx = [positions[0] for positions in missing.values()]
+        new_scores = score_fn([texts[i] for i in first_idx])
+        for positions, score in zip(missing.values(), new_scores):
+            scores[positions] = score
+        cache.put_many(model_name, model_revision, list(missing.keys()), new_scores)
+
+    return scores
+
+def score_with_uncertainty_cache(texts, model_name, model_revision, score_fn, cache=None):
+    texts = list(texts)
+    if cache is None:
+        return score_fn(texts)
+
+    scores = np.full(len(texts), NEUTRAL_SCORE, dtype=np.float64)
+    entropy = np.ones(len(texts), dtype=np.float64)
+    margin = np.zeros(len(texts), dtype=np.float64)
+    valid_idx = [i for i, t in enumerate(texts) if not is_blank_text(t)]
+
+    hashes = [text_hash(texts[i]) for i in valid_idx]
+    found = cache.get_many(model_name, model_revision, hashes, with_uncertainty=True)
+
+    missing = {}
+    for i, h in zip(valid_idx, hashes):
+        if h in found:
+            scores[i], entropy[i], margin[i] = found[h]
+        else:
+            missing.setdefault(h, []).append(i)
+
+    if missing:
+        first_idx = [positions[0] for positions in missing.values()]
+        new_scores, new_entropy, new_margin = score_fn([texts[i] for i in first_idx])
+        for positions, s, e, m in zip(missing.values(), new_scores, new_entropy, new_margin):
+            scores[positions], entropy[positions], margin[positions] = s, e, m
+        cache.put_many(model_name, model_revision, list(missing.keys()), new_scores, new_entropy, new_margin)
+
+    return scores, entropy, margin
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the persistent sentiment score cache.")
+    parser.add_argument('command', choices=['stats', 'evict', 'compact', 'clear'])
+    parser.add_argument('--days', type=float, default=None, help="evict: drop entries not used in the last N days")
+    parser.add_argument('--path', default=CACHE_PATH)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.path):
+        print(f"Cache not found at {args.path}")
+        return
+
+    cache = SentimentScoreCache(args.path)
+
+    if args.command == 'stats':
+        rows = cache.stats()
+        if not rows:
+            print("Cache is empty.")
+        for model_name, revision, count, first, last in rows:
+            print(f"{model_name} @ {revision[:12]}: {count} scores "
+                  f"(oldest {time.strftime('%Y-%m-%d', time.localtime(first))}, "
+                  f"last used {time.strftime('%Y-%m-%d', time.localtime(last))})")
+        print(f"File size: {os.path.getsize(args.path) / 1024 / 1024:.2f} MB")
+    elif args.command == 'evict':
+        if args.days is None:
+            print("Please specify --days for eviction.")
+            return
+        deleted = cache.evict(older_than_days=args.days)
+        print(f"Evicted {deleted} entries not used in the last {args.days} days.")
+    elif args.command == 'compact':
+        before = os.path.getsize(args.path)
+        cache.compact()
+        after = os.path.getsize(args.path)
+        print(f"Compacted cache: {before / 1024 / 1024:.2f} MB -> {after / 1024 / 1024:.2f} MB")
+    elif args.command == 'clear':
+        deleted = cache.clear()
+        print(f"Removed {deleted} entries.")
+
+    cache.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import os
+import json
+import glob
+import pandas as pd
+
+MANIFEST_NAME = 'manifest.json'
+
+def input_signature(path):
+    stat = os.stat(path)
+    return {'path': os.path.abspath(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+def write_json_atomic(path, data):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+class ChunkCheckpoint:
+    def __init__(self, parts_dir, input_path, chunk_size, settings=None, restart=False):
+        self.parts_dir = parts_dir
+        self.manifest_path = os.path.join(parts_dir, MANIFEST_NAME)
+        os.makedirs(parts_dir, exist_ok=True)
+
+        expected = {
+            'input': input_signature(input_path),
+            'chunk_size': chunk_size,
+            'settings': settings or {}
+        }
+
+        manifest = None
+        if not restart and os.path.exists(self.manifest_path):
+            with open(self.manifest_path, 'r') as f:
+                manifest = json.load(f)
+            if any(manifest.get(k) != v for k, v in expected.items()):
+                print("Checkpoint does not match the current input or settings, starting over.")
+                manifest = None
+
+        if manifest is None:
+            self.reset()
+            manifest = dict(expected, chunks={})
+            write_json_atomic(self.manifest_path, manifest)
+        elif manifest['chunks']:
+            print(f"Resuming from checkpoint: {len(manifest['chunks'])} chunks already completed.")
+
+        self.manifest = manifest
+
+    def reset(self):
+        for path in glob.glob(os.path.join(self.parts_dir, 'part-*.parquet*')):
+            os.remove(path)
+
+    def is_done(self, chunk_idx):
+        entry = self.manifest['chunks'].get(str(chunk_idx))
+        return entry is not None and os.path.exists(os.path.join(self.parts_dir, entry['file']))
+
+    def commit(self, chunk_idx, df):
+        filename = f"part-{chunk_idx:05d}.parquet"
+        path = os.path.join(self.parts_dir, filename)
+        tmp_path = path + '.tmp'
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+
+        self.manifest['chunks'][str(chunk_idx)] = {'file': filename, 'rows': len(df)}
+        write_json_atomic(self.manifest_path, self.manifest)
+
+    def part_paths(self):
+        chunks = sorted(self.manifest['chunks'].items(), key=lambda item: int(item[0]))
+        return [os.path.join(self.parts_dir, entry['file']) for _, entry in chunks]
+
+    def total_rows(self):
+        return sum(entry['rows'] for entry in self.manifest['chunks'].values())
+
+def iter_parts(part_paths):
+    for path in part_paths:
+        yield pd.read_parquet(path)
@@ -0,0 +1,82 @@
+import os
+import time
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+NEUTRAL_SCORE = 5.5
+MAX_SEQ_LENGTH = 512
+
+TOKEN_BUDGET = int(os.environ.get("SENTIMENT_TOKEN_BUDGET", 8192))
+MAX_BATCH_SIZE = int(os.environ.get("SENTIMENT_MAX_BATCH_SIZE", 64))
+
+def is_blank_text(text):
+    return (not isinstance(text, str) and pd.isna(text)) or not text
+
+def build_length_batches(lengths, token_budget=TOKEN_BUDGET, max_batch_size=MAX_BATCH_SIZE):
+    order = np.argsort(-np.asarray(lengths), kind='stable')
+
+    batches = []
+    current = []
+    current_max = 0
+    for idx in order:
+        length = int(lengths[idx])
+        batch_max = max(current_max, length)
+        if current and ((len(current) + 1) * batch_max > token_budget or len(current) >= max_batch_size):
+            batches.append(current)
+            current = []
+            batch_max = length
+        current.append(int(idx))
+        current_max = batch_max
+
+    if current:
+        batches.append(current)
+    return batches
+
+def predict_probabilities(texts, tokenizer, model, token_budget=TOKEN_BUDGET, max_batch_size=MAX_BATCH_SIZE, batch_stats=None):
+    import torch
+
+    num_labels = model.config.num_labels
+    probs = np.zeros((len(texts), num_labels), dtype=np.float32)
+    if not texts:
+        return probs
+
+    encodings = tokenizer([str(t) for t in texts], truncation=True, max_length=MAX_SEQ_LENGTH)
+    lengths = [len(ids) for ids in encodings['input_ids']]
+    keys = list(encodings.keys())
+
+    batches = build_length_batches(lengths, token_budget, max_batch_size)
+    with torch.inference_mode():
+        for batch in tqdm(batches, total=len(batches), leave=False):
+            features = [{k: encodings[k][i] for k in keys} for i in batch]
+            start = time.perf_counter()
+            inputs = tokenizer.pad(features, padding=True, return_tensors="pt")
+            logits = model(**inputs).logits
+            probs[batch] = torch.nn.functional.softmax(logits, dim=-1).cpu().numpy()
+            if batch_stats is not None:
+                batch_stats.append((len(batch), sum(lengths[i] for i in batch), time.perf_counter() - start))
+
+    return probs
+
+def score_texts_with_uncertainty(texts, tokenizer, model, weights, token_budget=TOKEN_BUDGET, max_batch_size=MAX_BATCH_SIZE):
+    texts = list(texts)
+    scores = np.full(len(texts), NEUTRAL_SCORE, dtype=np.float64)
+    entropy = np.ones(len(texts), dtype=np.float64)
+    margin = np.zeros(len(texts), dtype=np.float64)
+
+    valid_idx = [i for i, t in enumerate(texts) if not is_blank_text(t)]
+    if not valid_idx:
+        return scores, entropy, margin
+
+    probs = predict_probabilities([texts[i] for i in valid_idx], tokenizer, model, token_budget, max_batch_size)
+    probs = probs.astype(np.float64)
+    scores[valid_idx] = probs @ np.asarray(weights, dtype=np.float64)
+
+    clipped = np.clip(probs, 1e-12, 1.0)
+    entropy[valid_idx] = -(clipped * np.log(clipped)).sum(axis=1) / np.log(probs.shape[1])
+    top_two = np.sort(probs, axis=1)[:, -2:]
+    margin[valid_idx] = top_two[:, 1] - top_two[:, 0]
+    return scores, entropy, margin
+
+def score_texts(texts, tokenizer, model, weights, token_budget=TOKEN_BUDGET, max_batch_size=MAX_BATCH_SIZE):
+    return score_texts_with_uncertainty(texts, tokenizer, model, weights, token_budget, max_batch_size)[0]
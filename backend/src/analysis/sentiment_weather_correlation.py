@@ -5,52 +5,75 @@ import os
 import numpy as np
 from pathlib import Path
 import sys
+import argparse
 from datetime import timedelta
 
 sys.path.append(str(Path(__file__).resolve().parent.parent))
 from utils.airport_utils import get_icao_to_iata_mapping
+from utils.delay_cube import load_delay_cube, rollup
+from utils.flight_store import read_month_dataset
 
 AIRPORTS_PATH = os.path.join(Path(__file__).resolve().parent.parent.parent, "data", "processed", "airports", "airports_filtered.csv")
 
 BASE_DIR = Path(__file__).resolve().parents[3]
-FLIGHTS_FILE = BASE_DIR / "backend" / "data" / "merged" / "flights_with_weather.csv"
+FLIGHTS_DIR = BASE_DIR / "backend" / "data" / "merged" / "flights_with_weather"
+DELAYS_FILE = BASE_DIR / "backend" / "data" / "processed" / "delays" / "delays_consolidated_filtered.csv"
 SENTIMENT_FILE = BASE_DIR / "backend" / "data" / "sentiment" / "sentiment_results_delay.csv"
 
 OUTPUT_DIR = BASE_DIR / "backend" / "results" / "figures" / "sentiment_weather_correlation"
 TABLES_DIR = BASE_DIR / "backend" / "results" / "tables"
 
-def load_data(flights_path, sentiment_path):
-    print(f"Loading flights data from {flights_path}...")
-    cols = ['DepICAO', 'MinLateDeparted', 'MinLateArrived', 'Dep_prcp', 'Dep_wspd', 'Dep_temp', 'SchedDepUtc']
-    df_flights = pd.read_csv(flights_path, usecols=cols, low_memory=False)
-    df_flights['date'] = pd.to_datetime(df_flights['SchedDepUtc'], format='mixed', utc=True).dt.date
-    
+PRECIP_THRESHOLD = 5.0
+WIND_THRESHOLD = 30.0
+LAG_DAYS = 4
+
+def load_data(flights_dir, sentiment_path, lags=LAG_DAYS):
     print(f"Loading sentiment data from {sentiment_path}...")
     df_sentiment = pd.read_csv(sentiment_path)
-    df_sentiment['date'] = pd.to_datetime(df_sentiment['date'], format='mixed', utc=True).dt.date
+    sentiment_dates = pd.to_datetime(df_sentiment['date'], format='mixed', utc=True)
+    df_sentiment['date'] = sentiment_dates.dt.date
+    # Also load the days just before each review so events whose lag window reaches a review are kept.
+    event_dates = pd.concat([sentiment_dates, sentiment_dates - pd.Timedelta(days=max(lags - 1, 0))])
+    months = sorted(event_dates.dt.strftime('%Y-%m').dropna().unique())
+
+    print(f"Loading flights data from {flights_dir} for {len(months)} months with reviews...")
+    cols = ['DepICAO', 'Dep_prcp', 'Dep_wspd', 'Dep_temp', 'SchedDepUtc']
+    df_flights = read_month_dataset(flights_dir, columns=cols, months=months)
+    df_flights['date'] = df_flights['SchedDepUtc'].dt.date
     
     return df_flights, df_sentiment
 
-def aggregate_daily_data(df_flights, df_sentiment):
+def load_daily_delays(delays_path):
+    daily = rollup(load_delay_cube(delays_path), ['airport', 'date'], direction='dep')
+    return pd.DataFrame({
+        'airport_code': daily['airport'].astype(str),
+        'date': daily['date'].dt.date,
+        'MinLateDeparted': daily['dep_delay_sum'] / daily['dep_delay_n'].where(daily['dep_delay_n'] > 0),
+        'MinLateArrived': daily['arr_delay_sum'] / daily['arr_delay_n'].where(daily['arr_delay_n'] > 0)
+    })
+
+def aggregate_daily_sentiment(df_sentiment):
+    sentiment_daily = df_sentiment.groupby(['airport_code', 'date']).agg({
+        'weighted_score': 'mean',
+        'combined_score': lambda x: (x < 5.5).sum()
+    }).reset_index()
+    sentiment_daily.rename(columns={'combined_score': 'negative_review_count', 'weighted_score': 'daily_sentiment'}, inplace=True)
+    return sentiment_daily
+
+def aggregate_daily_weather(df_flights, daily_delays):
     print("Aggregating daily data...")
     
     weather_daily = df_flights.groupby(['DepICAO', 'date']).agg({
         'Dep_prcp': 'max',
         'Dep_wspd': 'max',
-        'Dep_temp': 'mean',
-        'MinLateDeparted': 'mean',
-        'MinLateArrived': 'mean'
+        'Dep_temp': 'mean'
     }).reset_index()
     
     icao_to_iata = get_icao_to_iata_mapping(AIRPORTS_PATH)
     weather_daily['airport_code'] = weather_daily['DepICAO'].map(icao_to_iata).fillna(weather_daily['DepICAO'])
-    
-    sentiment_daily = df_sentiment.groupby(['airport_code', 'date']).agg({
-        'weighted_score': 'mean',
-        'combined_score': lambda x: (x < 5.5).sum()
-    }).reset_index()
-    sentiment_daily.rename(columns={'combined_score': 'negative_review_count', 'weighted_score': 'daily_sentiment'}, inplace=True)
-    
+    return weather_daily.merge(daily_delays, on=['airport_code', 'date'], how='left')
+
+def aggregate_daily_data(weather_daily, sentiment_daily):
     daily_merged = pd.merge(weather_daily, sentiment_daily, on=['airport_code', 'date'], how='inner')
     
     print(f"Daily merged dataset has {len(daily_merged)} records.")
@@ -68,72 +91,92 @@ def calculate_correlation(df, tables_dir):
     corr_matrix.to_csv(os.path.join(tables_dir, 'correlation_delay_weather_summary.csv'))
     return corr_matrix
 
-def analyze_lagged_correlation(daily_data, tables_dir):
-    print("Analyzing lagged correlation for weather events...")
+def classify_weather_events(precip, wind):
+    is_rain_event = precip > PRECIP_THRESHOLD
+    is_wind_event = wind > WIND_THRESHOLD
+    return np.select(
+        [is_rain_event & is_wind_event, is_rain_event, is_wind_event],
+        ['Rain & Wind', 'Rain', 'Wind'],
+        default='None'
+    )
+
+def day_index(dates, first_day):
+    return (pd.to_datetime(dates).to_numpy().astype('datetime64[D]') - first_day).astype(np.int64)
+
+def calendar_lags(matrix, airport_idx, day_idx, lags):
+    windows = np.lib.stride_tricks.sliding_window_view(matrix, lags, axis=1)
+    return windows[airport_idx, day_idx]
+
+def analyze_lagged_correlation(weather_daily, sentiment_daily, tables_dir, lags=LAG_DAYS):
+    print(f"Analyzing lagged correlation for weather events ({lags} calendar day window)...")
     
-    PRECIP_THRESHOLD = 5.0
-    WIND_THRESHOLD = 30.0 
+    # Every weather day is a candidate event, whether or not it had reviews itself.
+    daily_data = weather_daily[weather_daily['airport_code'].isin(sentiment_daily['airport_code'])]
+    airport_codes = pd.Index(daily_data['airport_code'].unique())
+    reviews = sentiment_daily[sentiment_daily['airport_code'].isin(airport_codes)]
+    all_dates = pd.to_datetime(pd.concat([daily_data['date'], reviews['date']])).to_numpy().astype('datetime64[D]')
+    first_day = all_dates.min()
+    n_days = int((all_dates.max() - first_day).astype(np.int64)) + 1
     
-    results = []
+    # Dense (airport x calendar day) matrices built from every review day, not only the days that
+    # also have weather. Sentiment stays NaN on days without reviews; negative counts are 0 on those
+    # days inside the airport's review coverage and NaN outside it.
+    shape = (len(airport_codes), max(n_days, lags))
+    review_airport = airport_codes.get_indexer(reviews['airport_code'])
+    review_day = day_index(reviews['date'], first_day)
     
-    for airport in daily_data['airport_code'].unique():
-        airport_data = daily_data[daily_data['airport_code'] == airport].sort_values('date')
-        
-        for i in range(len(airport_data) - 3):
-            day_t = airport_data.iloc[i]
-            
-            is_rain_event = day_t['Dep_prcp'] > PRECIP_THRESHOLD
-            is_wind_event = day_t['Dep_wspd'] > WIND_THRESHOLD
-            
-            event_type = None
-            if is_rain_event and is_wind_event:
-                event_type = 'Rain & Wind'
-            elif is_rain_event:
-                event_type = 'Rain'
-            elif is_wind_event:
-                event_type = 'Wind'
-            else:
-                event_type = 'None'
-            
-            days_lag = []
-            for lag in range(4):
-                day_lagged = airport_data.iloc[i + lag]
-                days_lag.append({
-                    'lag': lag,
-                    'sentiment': day_lagged['daily_sentiment'],
-                    'negative_count': day_lagged['negative_review_count']
-                })
-            
-            results.append({
-                'airport_code': airport,
-                'event_date': day_t['date'],
-                'event_type': event_type,
-                'precip': day_t['Dep_prcp'],
-                'wind': day_t['Dep_wspd'],
-                'sentiment_t0': days_lag[0]['sentiment'],
-                'sentiment_t1': days_lag[1]['sentiment'],
-                'sentiment_t2': days_lag[2]['sentiment'],
-                'sentiment_t3': days_lag[3]['sentiment'],
-                'neg_count_t0': days_lag[0]['negative_count'],
-                'neg_count_t1': days_lag[1]['negative_count'],
-                'neg_count_t2': days_lag[2]['negative_count'],
-                'neg_count_t3': days_lag[3]['negative_count']
-            })
-
-    df_lagged = pd.DataFrame(results)
+    sentiment = np.full(shape, np.nan)
+    sentiment[review_airport, review_day] = reviews['daily_sentiment']
+    
+    first_review = np.full(len(airport_codes), shape[1])
+    last_review = np.full(len(airport_codes), -1)
+    np.minimum.at(first_review, review_airport, review_day)
+    np.maximum.at(last_review, review_airport, review_day)
+    days = np.arange(shape[1])
+    covered = (days >= first_review[:, None]) & (days <= last_review[:, None])
+    negative = np.where(covered, 0.0, np.nan)
+    negative[review_airport, review_day] = reviews['negative_review_count']
+    
+    data = daily_data.assign(
+        airport_idx=airport_codes.get_indexer(daily_data['airport_code']),
+        day_idx=day_index(daily_data['date'], first_day)
+    )
+    data = data[data['day_idx'] <= n_days - lags].sort_values(['airport_idx', 'day_idx'], kind='stable')
+    airport_idx = data['airport_idx'].to_numpy()
+    day_idx = data['day_idx'].to_numpy()
+    lagged_sentiment = calendar_lags(sentiment, airport_idx, day_idx, lags)
+    lagged_negative = calendar_lags(negative, airport_idx, day_idx, lags)
+    
+    df_lagged = pd.DataFrame({
+        'airport_code': data['airport_code'].to_numpy(),
+        'event_date': data['date'].to_numpy(),
+        'event_type': classify_weather_events(data['Dep_prcp'].to_numpy(), data['Dep_wspd'].to_numpy()),
+        'precip': data['Dep_prcp'].to_numpy(),
+        'wind': data['Dep_wspd'].to_numpy()
+    })
+    for lag in range(lags):
+        df_lagged[f'sentiment_t{lag}'] = lagged_sentiment[:, lag]
+    for lag in range(lags):
+        df_lagged[f'neg_count_t{lag}'] = lagged_negative[:, lag]
     
     os.makedirs(tables_dir, exist_ok=True)
     df_lagged.to_csv(os.path.join(tables_dir, 'weather_event_lagged_analysis.csv'), index=False)
     
-    print("Lagged analysis complete.")
+    coverage = np.isfinite(lagged_sentiment[:, 1:]).mean() * 100 if lags > 1 and len(df_lagged) else 0.0
+    print(f"Lagged analysis complete: {len(df_lagged)} airport-days over {n_days} calendar days, "
+          f"{coverage:.1f}% of follow-up days have reviews.")
     return df_lagged
 
+def lag_label(lag):
+    return 'Day of Event' if lag == 0 else f'Day +{lag}'
+
 def plot_results(df, df_lagged, output_dir):
     print("Plotting results...")
     sns.set_theme(style="whitegrid")
     
     if not df_lagged.empty:
-        lag_columns = ['sentiment_t0', 'sentiment_t1', 'sentiment_t2', 'sentiment_t3']
+        lags = sum(col.startswith('sentiment_t') for col in df_lagged.columns)
+        lag_columns = [f'sentiment_t{lag}' for lag in range(lags)]
         
         df_events = df_lagged[df_lagged['event_type'] != 'None'].copy()
         
@@ -145,12 +188,7 @@ def plot_results(df, df_lagged, output_dir):
                 value_name='Sentiment_Score'
             )
             
-            df_melted['Time_Lag'] = df_melted['Time_Lag'].map({
-                'sentiment_t0': 'Day of Event',
-                'sentiment_t1': 'Day +1',
-                'sentiment_t2': 'Day +2',
-                'sentiment_t3': 'Day +3'
-            })
+            df_melted['Time_Lag'] = df_melted['Time_Lag'].map({f'sentiment_t{lag}': lag_label(lag) for lag in range(lags)})
             
             plt.figure(figsize=(12, 8))
             sns.boxplot(x='Time_Lag', y='Sentiment_Score', hue='event_type', data=df_melted, palette='viridis')
@@ -163,7 +201,7 @@ def plot_results(df, df_lagged, output_dir):
             plt.savefig(os.path.join(output_dir, 'lagged_sentiment_boxplot.png'), dpi=300)
             plt.close()
             
-            neg_columns = ['neg_count_t0', 'neg_count_t1', 'neg_count_t2', 'neg_count_t3']
+            neg_columns = [f'neg_count_t{lag}' for lag in range(lags)]
             df_melted_neg = df_events.melt(
                 id_vars=['event_type'],
                 value_vars=neg_columns,
@@ -171,12 +209,7 @@ def plot_results(df, df_lagged, output_dir):
                 value_name='Negative_Reviews'
             )
             
-            df_melted_neg['Time_Lag'] = df_melted_neg['Time_Lag'].map({
-                'neg_count_t0': 'Day of Event',
-                'neg_count_t1': 'Day +1',
-                'neg_count_t2': 'Day +2',
-                'neg_count_t3': 'Day +3'
-            })
+            df_melted_neg['Time_Lag'] = df_melted_neg['Time_Lag'].map({f'neg_count_t{lag}': lag_label(lag) for lag in range(lags)})
 
             plt.figure(figsize=(12, 8))
             sns.lineplot(x='Time_Lag', y='Negative_Reviews', hue='event_type', data=df_melted_neg, marker='o', palette='viridis', linewidth=2, markersize=8)
@@ -240,26 +273,28 @@ def plot_results(df, df_lagged, output_dir):
     
     print(f"Plots saved to {output_dir}")
 
-def main():
+def main(lags=LAG_DAYS):
 
     os.makedirs(OUTPUT_DIR, exist_ok=True)
     
-    if not FLIGHTS_FILE.exists():
-        print(f"Error: {FLIGHTS_FILE} not found.")
+    if not FLIGHTS_DIR.exists():
+        print(f"Error: {FLIGHTS_DIR} not found.")
         return
     if not SENTIMENT_FILE.exists():
         print(f"Error: {SENTIMENT_FILE} not found.")
         return
 
-    df_flights, df_sentiment = load_data(FLIGHTS_FILE, SENTIMENT_FILE)
+    df_flights, df_sentiment = load_data(FLIGHTS_DIR, SENTIMENT_FILE, lags)
     
-    daily_merged = aggregate_daily_data(df_flights, df_sentiment)
+    sentiment_daily = aggregate_daily_sentiment(df_sentiment)
+    weather_daily = aggregate_daily_weather(df_flights, load_daily_delays(DELAYS_FILE))
+    daily_merged = aggregate_daily_data(weather_daily, sentiment_daily)
     
     if daily_merged.empty:
         print("No overlapping data found.")
         return
 
-    df_lagged = analyze_lagged_correlation(daily_merged, TABLES_DIR)
+    df_lagged = analyze_lagged_correlation(weather_daily, sentiment_daily, TABLES_DIR, lags)
     
     print("Deriving global stats from daily data...")
     global_stats = daily_merged.groupby('airport_code').agg({
@@ -277,4 +312,8 @@ def main():
     plot_results(global_stats, df_lagged, OUTPUT_DIR)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Correlate review sentiment with weather and delays.")
+    parser.add_argument('--lags', type=int, default=LAG_DAYS,
+                        help="number of days tracked after each weather event, including the event day")
+    args = parser.parse_args()
+    main(args.lags)
\ No newline at end of file
@@ -1,15 +1,22 @@
-import pandas as pd
 import matplotlib.pyplot as plt
 from pathlib import Path
 import numpy as np
+import sys
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from utils.flight_store import read_month_dataset
 
 BASE_DIR = Path(__file__).resolve().parents[3]
-INPUT_FILE = BASE_DIR / "backend" / "data" / "merged" / "flights_with_weather.csv"
+INPUT_DIR = BASE_DIR / "backend" / "data" / "merged" / "flights_with_weather"
+
+WEATHER_COLUMNS = ['Dep_temp', 'Dep_wspd', 'Dep_prcp', 'Dep_pres', 'Arr_temp', 'Arr_wspd', 'Arr_prcp', 'Arr_pres']
+DELAY_COLUMNS = ['MinLateDeparted', 'MinLateArrived']
 OUTPUT_DIR = BASE_DIR / "backend" / "results" / "figures" / "weather_impact"
 
-def analyze_weather_impact(input_file, output_dir):
-    print(f"Loading data from {input_file}...")
-    df = pd.read_csv(input_file, low_memory=False)
+def analyze_weather_impact(input_dir, output_dir):
+    print(f"Loading data from {input_dir}...")
+    df = read_month_dataset(input_dir, columns=['SchedDepApt'] + DELAY_COLUMNS + WEATHER_COLUMNS)
+    df[DELAY_COLUMNS] = df[DELAY_COLUMNS].astype('float64')
     
     Path(output_dir).mkdir(parents=True, exist_ok=True)
     
@@ -65,7 +72,7 @@ def analyze_weather_impact(input_file, output_dir):
     adverse_df = df_clean[adverse_weather_mask]
     
     top_airports = adverse_df['SchedDepApt'].value_counts().nlargest(20).index
-    avg_delay_adverse = adverse_df[adverse_df['SchedDepApt'].isin(top_airports)].groupby('SchedDepApt')['MinLateDeparted'].mean().sort_values()
+    avg_delay_adverse = adverse_df[adverse_df['SchedDepApt'].isin(top_airports)].groupby('SchedDepApt', observed=True)['MinLateDeparted'].mean().sort_values()
     
     plt.figure(figsize=(12, 8))
     plt.bar(avg_delay_adverse.index, avg_delay_adverse.values, color='skyblue')
@@ -81,4 +88,4 @@ def analyze_weather_impact(input_file, output_dir):
 
 if __name__ == "__main__":
     
-    analyze_weather_impact(INPUT_FILE, OUTPUT_DIR)
+    analyze_weather_impact(INPUT_DIR, OUTPUT_DIR)
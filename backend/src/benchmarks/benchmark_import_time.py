@@ -0,0 +1,59 @@
+import os
+import sys
+import subprocess
+
+current_script_dir = os.path.dirname(os.path.abspath(__file__))
+src_dir = os.path.dirname(current_script_dir)
+analysis_dir = os.path.join(src_dir, 'analysis')
+
+IMPORT_BUDGET_SECONDS = float(os.environ.get("IMPORT_BUDGET_SECONDS", 1.5))
+REPEATS = 3
+
+FORBIDDEN_MODULES = ['torch', 'transformers']
+
+PROBE = f"""
+import sys, time
+sys.path.insert(0, {analysis_dir!r})
+start = time.perf_counter()
+from sentiment_analysis import get_dynamic_strategic_hubs, FLIGHTS_DATA_PATH, AIRPORTS_PATH, DATA_DIR
+elapsed = time.perf_counter() - start
+loaded = [m for m in {FORBIDDEN_MODULES!r} if m in sys.modules]
+print(f"{{elapsed:.4f}} {{','.join(loaded)}}")
+"""
+
+def measure_import():
+    result = subprocess.run([sys.executable, '-c', PROBE], capture_output=True, text=True, check=True)
+    last_line = result.stdout.strip().splitlines()[-1]
+    parts = last_line.split(' ')
+    elapsed = float(parts[0])
+    loaded = [m for m in parts[1].split(',') if m] if len(parts) > 1 else []
+    return elapsed, loaded
+
+def main():
+    print(f"Measuring import time of sentiment_analysis helpers ({REPEATS} runs, budget {IMPORT_BUDGET_SECONDS:.2f}s)...")
+
+    timings = []
+    heavy_modules = set()
+    for i in range(REPEATS):
+        elapsed, loaded = measure_import()
+        timings.append(elapsed)
+        heavy_modules.update(loaded)
+        print(f"  Run {i + 1}: {elapsed:.3f}s")
+
+    best = min(timings)
+    print(f"Best import time: {best:.3f}s")
+
+    failed = False
+    if heavy_modules:
+        print(f"FAIL: importing the helpers pulled in {', '.join(sorted(heavy_modules))}.")
+        failed = True
+    if best > IMPORT_BUDGET_SECONDS:
+        print(f"FAIL: import time {best:.3f}s exceeds budget of {IMPORT_BUDGET_SECONDS:.2f}s.")
+        failed = True
+
+    if failed:
+        sys.exit(1)
+    print("OK: helpers import without loading any model.")
+
+if __name__ == "__main__":
+    main()
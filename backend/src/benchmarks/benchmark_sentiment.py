@@ -0,0 +1,190 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import resource
+import subprocess
+import tempfile
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+current_script_dir = os.path.dirname(os.path.abspath(__file__))
+src_dir = os.path.dirname(current_script_dir)
+backend_dir = os.path.dirname(src_dir)
+sys.path.append(os.path.join(src_dir, 'analysis'))
+
+from sentiment_engine import predict_probabilities, TOKEN_BUDGET
+from inference_backends import BACKENDS
+from sentiment_analysis import MODEL_A_NAME, MODEL_B_NAME
+
+COMBINED_DATA_PATH = os.path.join(backend_dir, 'data', 'merged', 'combined_data.csv')
+RESULTS_DIR = os.path.join(backend_dir, 'results', 'benchmarks')
+
+MODEL_NAMES = [MODEL_A_NAME, MODEL_B_NAME]
+
+CORPUS_SIZE = 400
+CORPUS_SEED = 42
+LONG_REVIEW_SHARE = 0.3
+
+TITLE_TEMPLATES = {
+    'EN': ["Flights delayed for hours at {apt} airport", "Strike causes chaos at {apt}", "Residents protest noise from {apt} runway"],
+    'IT': ["Voli in ritardo all'aeroporto di {apt}", "Sciopero, caos voli a {apt}", "Rumore aerei, proteste dei residenti a {apt}"],
+    'DE': ["Stundenlange Verspätungen am Flughafen {apt}", "Streik legt Flughafen {apt} lahm", "Fluglärm: Anwohner in {apt} protestieren"],
+    'FR': ["Vols retardés pendant des heures à l'aéroport de {apt}", "Grève: chaos à {apt}", "Bruit des avions à {apt}, les riverains protestent"],
+    'ES': ["Vuelos retrasados durante horas en el aeropuerto de {apt}", "Huelga provoca caos en {apt}", "Vecinos protestan por el ruido de {apt}"],
+}
+
+REVIEW_SENTENCES = [
+    "The security queue took almost an hour and only two lanes were open.",
+    "Our flight was delayed three times and nobody at the gate could explain why.",
+    "The terminal is clean, bright and easy to navigate even with small children.",
+    "Baggage claim was a nightmare, we waited ninety minutes for our luggage.",
+    "Staff at the information desk were friendly and helped us rebook quickly.",
+    "Seating near the gates is very limited and most shops close early in the evening.",
+    "Il personale è stato gentile ma i controlli di sicurezza erano lentissimi.",
+    "Der Transfer zwischen den Terminals war gut ausgeschildert und schnell.",
+]
+
+AIRPORT_NAMES = ["Milano Malpensa", "Frankfurt", "Paris CDG", "Madrid Barajas", "London Heathrow", "Roma Fiumicino"]
+
+def generate_corpus(size=CORPUS_SIZE, seed=CORPUS_SEED):
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(size):
+        if rng.random() < LONG_REVIEW_SHARE:
+            n_sentences = rng.randint(8, 30)
+            texts.append(' '.join(rng.choice(REVIEW_SENTENCES) for _ in range(n_sentences)))
+        else:
+            lang = rng.choice(list(TITLE_TEMPLATES.keys()))
+            texts.append(rng.choice(TITLE_TEMPLATES[lang]).format(apt=rng.choice(AIRPORT_NAMES)))
+    return texts
+
+def sample_corpus(size=CORPUS_SIZE, seed=CORPUS_SEED):
+    df = pd.read_csv(COMBINED_DATA_PATH, usecols=['text']).dropna().drop_duplicates()
+    return df.sample(min(size, len(df)), random_state=seed)['text'].tolist()
+
+def peak_rss_mb():
+    # ru_maxrss is reported in bytes on macOS and in kilobytes on Linux.
+    divisor = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / divisor
+
+def run_single(config, corpus_path):
+    import torch
+    from model_registry import get_model
+
+    torch.set_num_threads(config['threads'])
+    with open(corpus_path, 'r', encoding='utf-8') as f:
+        texts = json.load(f)
+
+    models = [get_model(name, config['backend']) for name in MODEL_NAMES]
+    for tokenizer, model in models:
+        predict_probabilities(texts[:4], tokenizer, model, config['token_budget'], config['batch_size'])
+
+    batch_stats = []
+    start = time.perf_counter()
+    for tokenizer, model in models:
+        predict_probabilities(texts, tokenizer, model, config['token_budget'], config['batch_size'], batch_stats=batch_stats)
+    elapsed = time.perf_counter() - start
+
+    latencies_ms = np.array([s[2] for s in batch_stats]) * 1000
+    total_tokens = sum(s[1] for s in batch_stats)
+    return dict(config,
+        n_texts=len(texts),
+        n_batches=len(batch_stats),
+        elapsed_sec=round(elapsed, 4),
+        texts_per_sec=round(len(texts) / elapsed, 2),
+        tokens_per_sec=round(total_tokens / elapsed, 1),
+        batch_latency_p50_ms=round(float(np.percentile(latencies_ms, 50)), 2),
+        batch_latency_p99_ms=round(float(np.percentile(latencies_ms, 99)), 2),
+        peak_rss_mb=round(peak_rss_mb(), 1)
+    )
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=backend_dir,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return 'unknown'
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput benchmark for the sentiment ensemble.")
+    parser.add_argument('--backends', nargs='+', choices=BACKENDS, default=['torch'])
+    parser.add_argument('--batch-sizes', nargs='+', type=int, default=[8, 32, 64])
+    parser.add_argument('--threads', nargs='+', type=int, default=[1, os.cpu_count() or 1])
+    parser.add_argument('--token-budget', type=int, default=TOKEN_BUDGET)
+    parser.add_argument('--corpus', choices=['synthetic', 'sample'], default='synthetic',
+                        help="fixed synthetic multilingual corpus, or a seeded sample of combined_data.csv")
+    parser.add_argument('--size', type=int, default=CORPUS_SIZE)
+    parser.add_argument('--output', default=None)
+    parser.add_argument('--single', default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--corpus-path', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        print(json.dumps(run_single(json.loads(args.single), args.corpus_path)))
+        return
+
+    if args.corpus == 'sample':
+        if not os.path.exists(COMBINED_DATA_PATH):
+            print(f"Error: {COMBINED_DATA_PATH} not found, use --corpus synthetic.")
+            return
+        texts = sample_corpus(args.size)
+    else:
+        texts = generate_corpus(args.size)
+    print(f"Benchmark corpus: {len(texts)} texts ({args.corpus}, seed {CORPUS_SEED})")
+
+    configs = [
+        {'backend': backend, 'batch_size': batch_size, 'threads': threads, 'token_budget': args.token_budget}
+        for backend in args.backends
+        for batch_size in args.batch_sizes
+        for threads in sorted(set(args.threads))
+    ]
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        corpus_path = os.path.join(tmp_dir, 'corpus.json')
+        with open(corpus_path, 'w', encoding='utf-8') as f:
+            json.dump(texts, f)
+
+        for config in configs:
+            print(f"Running backend={config['backend']} batch_size={config['batch_size']} threads={config['threads']}...")
+            proc = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--single', json.dumps(config), '--corpus-path', corpus_path],
+                capture_output=True, text=True
+            )
+            if proc.returncode != 0:
+                print(f"  FAILED: {proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else 'unknown error'}")
+                continue
+            result = json.loads(proc.stdout.strip().splitlines()[-1])
+            results.append(result)
+            print(f"  {result['texts_per_sec']} texts/s, {result['tokens_per_sec']} tokens/s, "
+                  f"p50 {result['batch_latency_p50_ms']} ms, p99 {result['batch_latency_p99_ms']} ms, "
+                  f"peak RSS {result['peak_rss_mb']} MB")
+
+    commit = git_commit()
+    report = {
+        'commit': commit,
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'corpus': args.corpus,
+        'corpus_size': len(texts),
+        'results': results
+    }
+
+    output_path = args.output or os.path.join(RESULTS_DIR, f"sentiment_benchmark_{commit}_{datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with open(output_path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    if results:
+        print("\n" + pd.DataFrame(results).drop(columns=['token_budget']).to_string(index=False))
+    print(f"\nSaved benchmark results to: {output_path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+current_script_dir = os.path.dirname(os.path.abspath(__file__))
+src_dir = os.path.dirname(current_script_dir)
+backend_dir = os.path.dirname(src_dir)
+sys.path.append(os.path.join(src_dir, 'analysis'))
+
+from sentiment_engine import score_texts
+from model_registry import get_model
+from inference_backends import BACKENDS
+from sentiment_analysis import INPUT_FILE, MODEL_A_NAME, MODEL_B_NAME, MODEL_A_WEIGHTS, MODEL_B_WEIGHTS
+
+OUTPUT_CSV = os.path.join(backend_dir, 'results', 'tables', 'sentiment_backend_drift.csv')
+
+SAMPLE_SIZE = 500
+SAMPLE_SEED = 42
+NEUTRAL_THRESHOLD = 5.5
+
+def score_sample(texts, backend):
+    start = time.perf_counter()
+    scores_a = score_texts(texts, *get_model(MODEL_A_NAME, backend), MODEL_A_WEIGHTS)
+    scores_b = score_texts(texts, *get_model(MODEL_B_NAME, backend), MODEL_B_WEIGHTS)
+    elapsed = time.perf_counter() - start
+
+    return pd.DataFrame({
+        'model_a_score': scores_a,
+        'model_b_score': scores_b,
+        'combined_score': (scores_a + scores_b) / 2
+    }), elapsed
+
+def drift_metrics(reference, candidate):
+    diff = candidate - reference
+    return {
+        'mae': np.abs(diff).mean(),
+        'rmse': np.sqrt((diff ** 2).mean()),
+        'max_abs_error': np.abs(diff).max(),
+        'mean_bias': diff.mean(),
+        'pearson_r': np.corrcoef(reference, candidate)[0, 1] if len(reference) > 1 else np.nan,
+        'polarity_flip_pct': ((reference < NEUTRAL_THRESHOLD) != (candidate < NEUTRAL_THRESHOLD)).mean() * 100
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare cheaper inference backends against fp32 torch.")
+    parser.add_argument('--sample-size', type=int, default=SAMPLE_SIZE)
+    parser.add_argument('--backends', nargs='+', choices=[b for b in BACKENDS if b != 'torch'],
+                        default=[b for b in BACKENDS if b != 'torch'])
+    args = parser.parse_args()
+
+    if not os.path.exists(INPUT_FILE):
+        print(f"Input file not found: {INPUT_FILE}")
+        return
+
+    df = pd.read_csv(INPUT_FILE, usecols=['text']).dropna()
+    df = df.drop_duplicates()
+    sample = df.sample(min(args.sample_size, len(df)), random_state=SAMPLE_SEED)
+    texts = sample['text'].tolist()
+    print(f"Held-out sample: {len(texts)} texts (seed {SAMPLE_SEED})")
+
+    print("Scoring reference (torch fp32)...")
+    reference, ref_elapsed = score_sample(texts, 'torch')
+    print(f"  {len(texts) / ref_elapsed:.1f} texts/sec")
+
+    rows = []
+    for backend in args.backends:
+        print(f"Scoring backend: {backend}...")
+        candidate, elapsed = score_sample(texts, backend)
+        print(f"  {len(texts) / elapsed:.1f} texts/sec (speedup x{ref_elapsed / elapsed:.2f})")
+
+        for col in reference.columns:
+            metrics = drift_metrics(reference[col].values, candidate[col].values)
+            rows.append({
+                'backend': backend,
+                'score': col,
+                'n_texts': len(texts),
+                'speedup_vs_fp32': round(ref_elapsed / elapsed, 3),
+                **{k: round(v, 5) for k, v in metrics.items()}
+            })
+
+    df_report = pd.DataFrame(rows)
+    os.makedirs(os.path.dirname(OUTPUT_CSV), exist_ok=True)
+    df_report.to_csv(OUTPUT_CSV, index=False)
+
+    print("\nAccuracy drift vs fp32:")
+    print(df_report.to_string(index=False))
+    print(f"\nSaved drift report to: {OUTPUT_CSV}")
+
+if __name__ == "__main__":
+    main()
@@ -1,35 +1,34 @@
 import os
+import sys
+import json
+import argparse
+import threading
+import numpy as np
 import pandas as pd
-from datetime import datetime
-from meteostat import Hourly, Stations
+import pyarrow.parquet as pq
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from meteostat import Hourly
 
 CURRENT_FILE = os.path.abspath(__file__)
 SCRIPTS_DIR = os.path.dirname(CURRENT_FILE)
 PROJECT_ROOT = os.path.abspath(os.path.join(SCRIPTS_DIR, "..", ".."))
+sys.path.append(os.path.dirname(SCRIPTS_DIR))
+
+from utils.weather_join import normalize_timestamp, time_column_name
+from utils.station_catalogue import load_station_catalogue, StationLocator
 
 AIRPORT_CSV_PATH = os.path.join(PROJECT_ROOT, "data", "processed", "airports", "airports_filtered.csv")
 WEATHER_OUTPUT_DIR = os.path.join(PROJECT_ROOT, "data", "raw", "weather")
+STATION_CACHE_PATH = os.path.join(WEATHER_OUTPUT_DIR, "_stations.json")
 
-os.makedirs(WEATHER_OUTPUT_DIR, exist_ok=True)
+HISTORY_START = datetime(2015, 1, 1, 0, 0)
+DOWNLOAD_WORKERS = int(os.environ.get("METEOSTAT_WORKERS", 8))
+ROW_GROUP_HOURS = 24 * 31
+UNRECORDED_STATION_MODES = ['infer', 'skip', 'adopt', 'repull']
+INFER_OVERLAP_HOURS = 72
 
-def get_best_meteostat_stations(ident: str, lat: float, lon: float):
-    stns = Stations()
-    nearby_stations = stns.nearby(lat, lon).fetch(5)
-    
-    if nearby_stations.empty:
-        return []
-        
-    station_ids = []
-    
-    icao_matches = nearby_stations[nearby_stations['icao'] == ident]
-    if not icao_matches.empty:
-        station_ids.append(icao_matches.index[0])
-        
-    for sid in nearby_stations.index:
-        if sid not in station_ids:
-            station_ids.append(sid)
-            
-    return station_ids
+os.makedirs(WEATHER_OUTPUT_DIR, exist_ok=True)
 
 def download_weather(station_id: str, start: datetime, end: datetime):
     try:
@@ -39,52 +38,183 @@ def download_weather(station_id: str, start: datetime, end: datetime):
         print(f"Error downloading weather for {station_id}: {e}")
         return None
 
-def main():
-    airports = pd.read_csv(AIRPORT_CSV_PATH)
-
-    start = datetime(2015, 1, 1, 0, 0)
-    end = datetime.now()
-
-    for _, row in airports.iterrows():
-        name = row["name"]
-        ident = row["ident"]
-        lat = row["latitude_deg"]
-        lon = row["longitude_deg"]
-
-        output_file = os.path.join(WEATHER_OUTPUT_DIR, f"{ident}.parquet")
-
-        if os.path.exists(output_file):
-            print(f"Skipping {ident}, already downloaded")
-            continue
-
-        print(f"\nProcessing airport {name} ({ident})")
-
-        station_ids = get_best_meteostat_stations(ident, lat, lon)
-
-        if not station_ids:
-            print(f"No Meteostat stations found for {ident}")
-            continue
-
-        weather = None
-        used_station = None
-
-        for sid in station_ids:
-            print(f"Trying Meteostat station -> {sid}")
-            w = download_weather(sid, start, end)
-            
-            if w is not None and not w.empty:
-                weather = w
-                used_station = sid
-                break
-            else:
-                print(f"Station {sid} returned no data, trying next...")
+class StationCache:
+    def __init__(self, path=STATION_CACHE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                self.entries = json.load(f)
+
+    def resolve(self, airports, start, end):
+        missing = airports[~airports['ident'].isin(self.entries.keys())]
+        if missing.empty:
+            return
+
+        locator = StationLocator(load_station_catalogue())
+        ranked = locator.rank(missing['ident'], missing['latitude_deg'], missing['longitude_deg'], start, end)
+        with self.lock:
+            for ident, station_ids in ranked.items():
+                self.entries[ident] = {'candidates': station_ids, 'station': None}
+        print(f"Resolved weather stations for {len(ranked)} airports from the local catalogue.")
+
+    def candidates(self, ident, pinned=False):
+        with self.lock:
+            entry = self.entries.get(ident)
+        if entry is None:
+            return []
+        used = entry.get('station')
+        if used and pinned:
+            return [used]
+        return ([used] if used else []) + [sid for sid in entry['candidates'] if sid != used]
+
+    def recorded_station(self, ident):
+        with self.lock:
+            return (self.entries.get(ident) or {}).get('station')
+
+    def set_station(self, ident, station_id):
+        with self.lock:
+            self.entries.setdefault(ident, {'candidates': [station_id]})['station'] = station_id
+
+    def save(self):
+        with self.lock:
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self.entries, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+def last_stored_time(path):
+    pf = pq.ParquetFile(path)
+    names = pf.schema_arrow.names
+    time_col = time_column_name(names)
+    if time_col is None:
+        return None
 
+    time_idx = names.index(time_col)
+    last = None
+    for rg in range(pf.num_row_groups):
+        stats = pf.metadata.row_group(rg).column(time_idx).statistics
+        if stats is None or not stats.has_min_max:
+            return normalize_timestamp(pd.read_parquet(path, columns=[]).index.max())
+        value = normalize_timestamp(stats.max)
+        last = value if last is None or value > last else last
+    return last
+
+def save_weather(weather, output_file):
+    tmp_path = os.path.join(os.path.dirname(output_file), f".{os.path.basename(output_file)}.tmp")
+    weather.to_parquet(tmp_path, row_group_size=ROW_GROUP_HOURS)
+    os.replace(tmp_path, output_file)
+
+def infer_station(existing, station_ids):
+    overlap = existing.iloc[-INFER_OVERLAP_HOURS:]
+    start = overlap.index.min().to_pydatetime()
+    end = overlap.index.max().to_pydatetime()
+
+    matches = []
+    for sid in station_ids:
+        weather = download_weather(sid, start, end)
         if weather is None or weather.empty:
-            print(f"No weather data found for {ident} across all nearby stations")
             continue
-
-        weather.to_parquet(output_file)
-        print(f"Saved -> {output_file} (using station {used_station})")
+        common = overlap.index.intersection(weather.index)
+        columns = [c for c in overlap.columns if c in weather.columns and pd.api.types.is_numeric_dtype(overlap[c])]
+        if len(common) == 0 or not columns:
+            continue
+        stored = overlap.loc[common, columns].to_numpy(np.float64)
+        fetched = weather.loc[common, columns].to_numpy(np.float64)
+        if np.allclose(stored, fetched, equal_nan=True):
+            matches.append(sid)
+    return matches
+
+def update_airport(row, cache, end, unrecorded='infer'):
+    ident = row["ident"]
+    output_file = os.path.join(WEATHER_OUTPUT_DIR, f"{ident}.parquet")
+
+    existing = None
+    start = HISTORY_START
+    if os.path.exists(output_file) and not (unrecorded == 'repull' and cache.recorded_station(ident) is None):
+        last = last_stored_time(output_file)
+        if last is not None:
+            start = (last + timedelta(hours=1)).to_pydatetime()
+        if start > end:
+            return ident, 'up to date', 0
+        existing = pd.read_parquet(output_file)
+
+    station_ids = cache.candidates(ident, pinned=existing is not None)
+    if not station_ids:
+        return ident, 'no stations', 0
+
+    if existing is not None and cache.recorded_station(ident) is None:
+        if existing.index.tz is not None:
+            existing.index = existing.index.tz_convert(None)
+        if unrecorded == 'infer':
+            matches = infer_station(existing, station_ids)
+            if len(matches) != 1:
+                print(f"Warning: {ident}.parquet has no recorded source station and {len(matches)} candidates match "
+                      f"its last {INFER_OVERLAP_HOURS} hours; not appending. Use --unrecorded-station adopt or repull.")
+                return ident, 'skipped (no recorded station)', 0
+            print(f"{ident}.parquet has no recorded source station; its history matches station {matches[0]}.")
+            station_ids = matches
+        elif unrecorded == 'skip':
+            print(f"Warning: {ident}.parquet has no recorded source station; not appending hours that may come "
+                  f"from a different station. Re-run with --unrecorded-station adopt or repull.")
+            return ident, 'skipped (no recorded station)', 0
+        else:
+            print(f"Warning: {ident}.parquet has no recorded source station; assuming top-ranked station {station_ids[0]}.")
+            station_ids = station_ids[:1]
+
+    for sid in station_ids:
+        weather = download_weather(sid, start, end)
+        if weather is not None and not weather.empty:
+            break
+    else:
+        return ident, 'no new data' if existing is not None else 'no data', 0
+
+    cache.set_station(ident, sid)
+    if existing is not None:
+        if existing.index.tz is not None:
+            existing.index = existing.index.tz_convert(None)
+        weather = pd.concat([existing, weather])
+        weather = weather[~weather.index.duplicated(keep='last')].sort_index()
+
+    save_weather(weather, output_file)
+    added = len(weather) - (len(existing) if existing is not None else 0)
+    return ident, f"saved from station {sid}", added
+
+def main(workers=DOWNLOAD_WORKERS, unrecorded='infer'):
+    airports = pd.read_csv(AIRPORT_CSV_PATH)
+    cache = StationCache(STATION_CACHE_PATH)
+    end = datetime.now()
+    cache.resolve(airports, HISTORY_START, end)
+
+    print(f"Updating weather for {len(airports)} airports ({workers} workers)...")
+    results = {}
+    skipped = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(update_airport, row, cache, end, unrecorded): row["ident"] for _, row in airports.iterrows()}
+        for future in as_completed(futures):
+            try:
+                ident, status, added = future.result()
+            except Exception as e:
+                ident, status, added = futures[future], f"failed ({e})", 0
+            results[ident] = added
+            if status.startswith('skipped'):
+                skipped.append(ident)
+            print(f"{ident}: {status}, {added} new hours")
+            cache.save()
+
+    print(f"\nDone. Appended {sum(results.values())} hours across "
+          f"{sum(1 for added in results.values() if added > 0)} / {len(airports)} airports.")
+    if skipped:
+        print(f"Skipped {len(skipped)} files with no recorded source station: {', '.join(sorted(skipped))}. "
+              f"Re-run with --unrecorded-station adopt or repull to update them.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Download or incrementally update Meteostat hourly weather per airport.")
+    parser.add_argument('--workers', type=int, default=DOWNLOAD_WORKERS,
+                        help="number of airports fetched concurrently")
+    parser.add_argument('--unrecorded-station', choices=UNRECORDED_STATION_MODES, default='infer',
+                        help="for existing files with no recorded source station: infer it from the stored "
+                             "history, skip them, adopt the top-ranked station, or re-pull the full history")
+    args = parser.parse_args()
+    main(args.workers, args.unrecorded_station)
@@ -2,22 +2,27 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import os
 import numpy as np
+import sys
 from scipy.stats import pearsonr, spearmanr
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.delay_cube import load_delay_cube, rollup
+
 BASE_DIR = '/Users/davidegirolamo/Programming/FlightDelayAnalysis/FlightDelayAnalysis/backend'
 delays_file = os.path.join(BASE_DIR, 'data', 'processed', 'delays', 'delays_consolidated_filtered.csv')
 sentiment_file = os.path.join(BASE_DIR, 'data', 'sentiment', 'sentiment_results_delay.csv')
 output_plot = os.path.join(BASE_DIR, 'results', 'figures', 'delay', 'sentiment_delay_vs_delay.png')
 
 print("Loading Delays...")
-df_delays = pd.read_csv(delays_file, usecols=['OrigDate', 'MinLateDeparted', 'Cancelled'])
-df_delays['OrigDate'] = pd.to_datetime(df_delays['OrigDate'])
-df_delays['MinLateDeparted'] = pd.to_numeric(df_delays['MinLateDeparted'], errors='coerce').fillna(0)
+cube = load_delay_cube(delays_file)
+daily_cube = rollup(cube, ['date'], direction='dep')
 
-print(f"Delays dates: {df_delays['OrigDate'].min().strftime('%Y-%m-%d')} to {df_delays['OrigDate'].max().strftime('%Y-%m-%d')}")
+print(f"Delays dates: {daily_cube['date'].min().strftime('%Y-%m-%d')} to {daily_cube['date'].max().strftime('%Y-%m-%d')}")
 
-daily_delays = df_delays.groupby('OrigDate')['MinLateDeparted'].mean().reset_index()
-daily_delays.columns = ['date', 'avg_delay']
+daily_delays = pd.DataFrame({
+    'date': daily_cube['date'],
+    'avg_delay': daily_cube['dep_delay_sum'] / daily_cube['n_operated'].where(daily_cube['n_operated'] > 0)
+})
 
 print("Loading Sentiment...")
 df_sent = pd.read_csv(sentiment_file, usecols=['date', 'combined_score'])
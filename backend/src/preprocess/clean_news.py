@@ -1,9 +1,13 @@
 import pandas as pd
 import os
 import re
+import sys
 import json
 from datetime import datetime
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.keyword_tagger import KeywordTagger
+
 current_script_dir = os.path.dirname(os.path.abspath(__file__))
 src_dir = os.path.dirname(current_script_dir)
 backend_dir = os.path.dirname(src_dir)
@@ -87,25 +91,20 @@ def clean_text(text):
     text = re.sub(r'\s+', ' ', text).strip() 
     return text.lower()
 
-def build_regex_pattern(keywords):
-    sorted_keywords = sorted(list(keywords), key=len, reverse=True)
-    pattern = r'\b(?:' + '|'.join(map(re.escape, sorted_keywords)) + r')\b'
-    
-    return re.compile(pattern, re.IGNORECASE)
-
-def contains_exclusion(text, exclusion_pattern):
-    return bool(exclusion_pattern.search(text))
+def build_relevance_tagger(sentiment_keywords):
+    return KeywordTagger({
+        'context': AVIATION_CONTEXT_KEYWORDS,
+        'sentiment': sentiment_keywords,
+        'exclusion': FALSE_POSITIVE_EXCLUSIONS
+    }, word_boundaries=True)
 
-def is_strictly_relevant(row, context_pattern, sentiment_pattern, exclusion_pattern):
-    title = clean_text(str(row.get('title', '')))
+def is_strictly_relevant(title, tagger):
+    tags = tagger.tag(clean_text(str(title)))
     
-    if contains_exclusion(title, exclusion_pattern):
+    if 'exclusion' in tags:
         return False
     
-    has_aviation_context = bool(context_pattern.search(title))
-    has_sentiment_keyword = bool(sentiment_pattern.search(title))
-    
-    return has_aviation_context and has_sentiment_keyword
+    return 'context' in tags and 'sentiment' in tags
 
 def main():
     if not os.path.exists(INPUT_FILE):
@@ -119,10 +118,8 @@ def main():
         print("No sentiment keywords loaded. Exiting.")
         return
 
-    print(f"Compiling Regex Patterns with Word Boundaries (\\b)...")
-    context_pattern = build_regex_pattern(AVIATION_CONTEXT_KEYWORDS)
-    sentiment_pattern = build_regex_pattern(sentiment_keywords)
-    exclusion_pattern = build_regex_pattern(FALSE_POSITIVE_EXCLUSIONS)
+    print(f"Building keyword automaton with word boundaries...")
+    tagger = build_relevance_tagger(sentiment_keywords)
     print(f"Reading raw news from: {INPUT_FILE}")
     try:
         df = pd.read_csv(INPUT_FILE)
@@ -141,7 +138,8 @@ def main():
     else:
         print("Warning: 'published' column not found, skipping date filter.")
 
-    df_filtered = df[df.apply(lambda row: is_strictly_relevant(row, context_pattern, sentiment_pattern, exclusion_pattern), axis=1)]
+    relevant_mask = df['title'].map(lambda title: is_strictly_relevant(title, tagger)).astype(bool)
+    df_filtered = df[relevant_mask]
     
     df_filtered = df_filtered.drop_duplicates(subset=['title', 'link'])
     
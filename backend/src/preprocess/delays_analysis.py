@@ -1,9 +1,108 @@
 import os
 import glob
+import sys
+import argparse
+import hashlib
 import pandas as pd
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
-def analyze_delays():
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from utils.flight_store import (reset_flight_store, write_flight_partitions, remove_flight_parts, flight_part_paths,
+                                unreferenced_flight_parts, load_flights, store_dir_for, file_signature, file_sha256,
+                                load_ingest_manifest, save_ingest_manifest)
+from utils.delay_cube import refresh_delay_cube
+
+INGEST_WORKERS = int(os.environ.get("DELAYS_INGEST_WORKERS", os.cpu_count() or 1))
+INGEST_CHUNK_SIZE = int(os.environ.get("DELAYS_INGEST_CHUNK_SIZE", 200000))
+
+ANALYSIS_COLUMNS = ['SchedDepApt', 'SchedDepLocal', 'MinLateDeparted', 'MinLateArrived', 'AirlineCode']
+
+def ingest_file(file_path, euro_airports, store_dir, chunk_size):
+    stats = {'file': Path(file_path).name, 'raw_rows': 0, 'kept_rows': 0, 'columns': [], 'parts': [], 'error': None}
+    try:
+        stats['signature'] = dict(file_signature(file_path), sha256=file_sha256(file_path))
+        reader = pd.read_csv(file_path, sep='\t', dtype=str, chunksize=chunk_size)
+        for chunk_idx, chunk in enumerate(reader):
+            if chunk_idx == 0:
+                stats['columns'] = list(chunk.columns)
+                if 'SchedDepApt' not in chunk.columns or 'SchedArrApt' not in chunk.columns:
+                    stats['error'] = "'SchedDepApt' or 'SchedArrApt' columns missing"
+                    return stats
+
+            stats['raw_rows'] += len(chunk)
+            chunk = chunk[chunk['SchedDepApt'].isin(euro_airports) & chunk['SchedArrApt'].isin(euro_airports)]
+            if chunk.empty:
+                continue
+
+            stats['kept_rows'] += len(chunk)
+            part_name = f"{Path(file_path).stem}-{chunk_idx:05d}"
+            stats['parts'] += write_flight_partitions(chunk, store_dir, part_name)
+    except Exception as e:
+        stats['error'] = str(e)
+        remove_flight_parts(store_dir, [rel_path for _, rel_path in stats['parts']])
+        stats['parts'] = []
+    return stats
+
+def ingest_raw_files(txt_files, euro_airports, store_dir, workers, chunk_size):
+    workers = max(1, min(workers, len(txt_files)))
+    print(f"Ingesting {len(txt_files)} files with {workers} worker processes, {chunk_size} rows per chunk...")
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(ingest_file, str(path), euro_airports, store_dir, chunk_size): path for path in txt_files}
+        for future in as_completed(futures):
+            stats = future.result()
+            stats['path'] = futures[future]
+            if stats['error']:
+                print(f"Error reading {stats['file']}: {stats['error']}")
+            else:
+                print(f"  {stats['file']}: kept {stats['kept_rows']} of {stats['raw_rows']} flights")
+            results.append(stats)
+    return results
+
+def airports_fingerprint(euro_airports):
+    return hashlib.sha256('|'.join(sorted(euro_airports)).encode('utf-8')).hexdigest()
+
+def plan_ingest(txt_files, manifest):
+    known = manifest['files']
+    to_ingest, changed = [], []
+    for path in txt_files:
+        entry = known.get(path.name)
+        if entry is None:
+            to_ingest.append(path)
+            continue
+
+        signature = file_signature(path)
+        if signature['size'] == entry['size'] and signature['mtime_ns'] == entry['mtime_ns']:
+            continue
+
+        if file_sha256(path) == entry['sha256']:
+            entry.update(signature)
+            continue
+        to_ingest.append(path)
+        changed.append(path.name)
+
+    present = {path.name for path in txt_files}
+    removed = [name for name in known if name not in present]
+    return to_ingest, changed, removed
+
+def export_store_to_csv(store_dir, columns, output_csv):
+    tmp_path = str(output_csv) + '.tmp'
+    header = True
+    for path in flight_part_paths(store_dir):
+        part = pd.read_parquet(path).reindex(columns=columns)
+        part.to_csv(tmp_path, mode='w' if header else 'a', header=header, index=False)
+        header = False
+    if header:
+        pd.DataFrame(columns=columns).to_csv(tmp_path, index=False)
+    os.replace(tmp_path, output_csv)
+
+def append_parts_to_csv(store_dir, rel_paths, columns, output_csv):
+    for path in flight_part_paths(store_dir, rel_paths):
+        pd.read_parquet(path).reindex(columns=columns).to_csv(output_csv, mode='a', header=False, index=False)
+
+def analyze_delays(workers=INGEST_WORKERS, chunk_size=INGEST_CHUNK_SIZE, full_rebuild=False):
     base_dir = Path(__file__).resolve().parent.parent.parent
     raw_delays_dir = base_dir / "data" / "raw" / "delays"
     processed_dir = base_dir / "data" / "processed" / "delays"
@@ -22,49 +121,103 @@ def analyze_delays():
         print(airports_df.columns)
         return
     
-    euro_airports = set(airports_df['iata_code'].dropna().unique())
+    euro_airports = frozenset(airports_df['iata_code'].dropna().unique())
     print(f"Loaded {len(euro_airports)} European airports.")
 
-    txt_files = list(raw_delays_dir.glob("*.txt"))
+    txt_files = sorted(raw_delays_dir.glob("*.txt"))
     if not txt_files:
         print(f"No .txt files found in {raw_delays_dir}")
         return
 
     print(f"Found {len(txt_files)} delay files to process.")
 
-    all_dfs = []
-    for file_path in txt_files:
-        try:
-            df = pd.read_csv(file_path, sep='\t', low_memory=False)
-            all_dfs.append(df)
-        except Exception as e:
-            print(f"Error reading {file_path}: {e}")
+    store_dir = store_dir_for(output_csv)
+    fingerprint = airports_fingerprint(euro_airports)
+    manifest = None if full_rebuild else load_ingest_manifest(store_dir)
+    if manifest is not None and manifest.get('airports_sha256') != fingerprint:
+        print("European airport list changed since the last ingest, rebuilding the flight store.")
+        manifest = None
+    if manifest is None:
+        reset_flight_store(store_dir)
+        manifest = {'airports_sha256': fingerprint, 'columns': [], 'files': {}, 'dirty_months': []}
 
-    if not all_dfs:
-        print("No delay data could be read.")
-        return
+    to_ingest, changed, removed = plan_ingest(txt_files, manifest)
+    print(f"Manifest: {len(txt_files) - len(to_ingest)} files unchanged, "
+          f"{len(to_ingest) - len(changed)} new, {len(changed)} changed, {len(removed)} removed.")
 
-    full_df = pd.concat(all_dfs, ignore_index=True)
-    print(f"Total raw flights loaded: {len(full_df)}")
+    dirty_months = set(manifest['dirty_months'])
+    orphans = unreferenced_flight_parts(store_dir, manifest)
+    if orphans:
+        print(f"Removing {len(orphans)} store parts not referenced by the manifest (left by an interrupted ingest).")
+        remove_flight_parts(store_dir, [rel_path for _, rel_path in orphans])
+        dirty_months.update(month for month, _ in orphans)
+    for name in changed + removed:
+        entry = manifest['files'].pop(name)
+        save_ingest_manifest(manifest, store_dir)
+        remove_flight_parts(store_dir, entry['parts'])
+        dirty_months.update(entry['months'])
 
-    if 'SchedDepApt' not in full_df.columns or 'SchedArrApt' not in full_df.columns:
-        print("Error: 'SchedDepApt' or 'SchedArrApt' columns missing in delay data.")
+    if not to_ingest and not changed and not removed:
+        manifest['dirty_months'] = sorted(dirty_months)
+        save_ingest_manifest(manifest, store_dir)
+        if output_csv.exists():
+            print("Flight store is up to date, nothing to ingest.")
+            refresh_delay_cube(output_csv)
+            return
+
+    results = []
+    if to_ingest:
+        results = ingest_raw_files(to_ingest, euro_airports, store_dir, workers, chunk_size)
+
+    new_columns = list(manifest['columns'])
+    for r in results:
+        if r['error']:
+            continue
+        months = sorted({month for month, _ in r['parts']})
+        manifest['files'][r['file']] = {
+            'path': str(r['path']),
+            **r['signature'],
+            'raw_rows': r['raw_rows'],
+            'kept_rows': r['kept_rows'],
+            'parts': [rel_path for _, rel_path in r['parts']],
+            'months': months
+        }
+        new_columns += [c for c in r['columns'] if c not in new_columns]
+        dirty_months.update(months)
+
+    if not manifest['files']:
+        print("No delay data could be read.")
         return
 
-    filtered_df = full_df[
-        full_df['SchedDepApt'].isin(euro_airports) & 
-        full_df['SchedArrApt'].isin(euro_airports)
-    ].copy()
+    appended_only = not changed and not removed and new_columns == manifest['columns'] and output_csv.exists()
+    manifest['columns'] = new_columns
+    manifest['dirty_months'] = sorted(dirty_months)
+    save_ingest_manifest(manifest, store_dir)
 
-    print(f"Filtered European flights: {len(filtered_df)} ({(len(filtered_df)/len(full_df))*100:.2f}% of original)")
+    ingested = [r for r in results if not r['error']]
+    total_raw = sum(e['raw_rows'] for e in manifest['files'].values())
+    total_kept = sum(e['kept_rows'] for e in manifest['files'].values())
+    print(f"Ingested {len(ingested)} files this run, {len(manifest['files'])} files in the store.")
+    print(f"Total raw flights read: {total_raw}")
+    print(f"Filtered European flights: {total_kept} ({(total_kept/max(total_raw, 1))*100:.2f}% of original)")
+    print(f"Months pending downstream refresh: {', '.join(manifest['dirty_months']) or 'none'}")
 
     try:
-        filtered_df.to_csv(output_csv, index=False)
-        print(f"Successfully saved filtered consolidated data to {output_csv}")
+        if appended_only:
+            new_parts = [rel_path for r in ingested for _, rel_path in r['parts']]
+            append_parts_to_csv(store_dir, new_parts, new_columns, output_csv)
+            print(f"Appended {len(ingested)} new files to {output_csv}")
+        else:
+            export_store_to_csv(store_dir, new_columns, output_csv)
+            print(f"Successfully saved filtered consolidated data to {output_csv}")
     except Exception as e:
         print(f"Error saving CSV: {e}")
         return
 
+    refresh_delay_cube(output_csv)
+
+    filtered_df = load_flights([c for c in ANALYSIS_COLUMNS if c in new_columns], csv_path=output_csv)
+
     print("\n--- Quick Data Analysis (Filtered European Flights) ---")
 
     total_flights = len(filtered_df)
@@ -83,12 +236,12 @@ def analyze_delays():
     delay_arr_col = 'MinLateArrived'
     
     if delay_dep_col in filtered_df.columns:
-        filtered_df[delay_dep_col] = pd.to_numeric(filtered_df[delay_dep_col], errors='coerce').fillna(0)
+        filtered_df[delay_dep_col] = filtered_df[delay_dep_col].fillna(0)
         avg_dep_delay = filtered_df[delay_dep_col].mean()
         print(f"Average Departure Delay: {avg_dep_delay:.2f} minutes")
     
     if delay_arr_col in filtered_df.columns:
-        filtered_df[delay_arr_col] = pd.to_numeric(filtered_df[delay_arr_col], errors='coerce').fillna(0)
+        filtered_df[delay_arr_col] = filtered_df[delay_arr_col].fillna(0)
         avg_arr_delay = filtered_df[delay_arr_col].mean()
         print(f"Average Arrival Delay: {avg_arr_delay:.2f} minutes")
         
@@ -98,13 +251,21 @@ def analyze_delays():
 
     if 'AirlineCode' in filtered_df.columns and delay_arr_col in filtered_df.columns:
         print("\nTop 5 Airlines with Highest Average Arrival Delay:")
-        airline_delays = filtered_df.groupby('AirlineCode')[delay_arr_col].mean().sort_values(ascending=False).head(5)
+        airline_delays = filtered_df.groupby('AirlineCode', observed=True)[delay_arr_col].mean().sort_values(ascending=False).head(5)
         print(airline_delays)
 
     if 'SchedDepApt' in filtered_df.columns and delay_dep_col in filtered_df.columns:
         print("\nTop 5 Departure Airports with Highest Average Departure Delay:")
-        apt_delays = filtered_df.groupby('SchedDepApt')[delay_dep_col].mean().sort_values(ascending=False).head(5)
+        apt_delays = filtered_df.groupby('SchedDepApt', observed=True)[delay_dep_col].mean().sort_values(ascending=False).head(5)
         print(apt_delays)
 
 if __name__ == "__main__":
-    analyze_delays()
+    parser = argparse.ArgumentParser(description="Filter raw delay files to European airport pairs.")
+    parser.add_argument('--workers', type=int, default=INGEST_WORKERS,
+                        help="number of worker processes parsing raw files")
+    parser.add_argument('--chunk-size', type=int, default=INGEST_CHUNK_SIZE,
+                        help="rows parsed per chunk; peak memory is roughly chunk size x workers")
+    parser.add_argument('--full-rebuild', action='store_true',
+                        help="ignore the ingest manifest and re-read every raw file")
+    args = parser.parse_args()
+    analyze_delays(args.workers, args.chunk_size, args.full_rebuild)
@@ -0,0 +1,176 @@
+import os
+import shutil
+import numpy as np
+import pandas as pd
+
+from utils.flight_store import (FLIGHTS_CSV_PATH, PARTITION_COLUMN, load_flights, flight_store_exists, store_dir_for,
+                                store_months, pending_months, clear_pending_months)
+from utils.delay_sketch import SKETCH_ALPHA, build_sketch_frame, read_sketch_alpha, write_sketch_alpha
+
+CUBE_NAME = 'delay_cube'
+SKETCH_NAME = 'delay_sketch'
+CUBE_SOURCE_COLUMNS = ['SchedDepApt', 'SchedArrApt', 'MinLateDeparted', 'MinLateArrived', 'Cancelled', 'SchedDepUtc', 'SchedArrUtc']
+CUBE_KEYS = ['airport', 'direction', 'date', 'hour']
+DIRECTIONS = {'dep': ('SchedDepApt', 'SchedDepUtc'), 'arr': ('SchedArrApt', 'SchedArrUtc')}
+DELAYS = {'dep': 'MinLateDeparted', 'arr': 'MinLateArrived'}
+
+# Buckets are [lo, hi) on whole minutes, so the 16 edge keeps the strict "> 15" share exact.
+DELAY_BUCKET_EDGES = [15, 16, 30, 60]
+
+def bucket_bounds(edges=DELAY_BUCKET_EDGES):
+    bounds = [None] + list(edges) + [None]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def bucket_label(lo, hi):
+    if lo is None:
+        return f"lt{hi}"
+    if hi is None:
+        return f"ge{lo}"
+    return f"{lo}_{hi}"
+
+def bucket_columns(prefix):
+    return [f"{prefix}_bucket_{bucket_label(lo, hi)}" for lo, hi in bucket_bounds()]
+
+METRIC_COLUMNS = ['n_flights', 'n_cancelled', 'n_operated'] + [
+    col
+    for prefix in DELAYS
+    for col in [f"{prefix}_delay_n", f"{prefix}_delay_sum", f"{prefix}_delay_sumsq"] + bucket_columns(prefix)
+]
+
+def cube_dir_for(csv_path):
+    return os.path.join(os.path.dirname(os.path.abspath(csv_path)), CUBE_NAME)
+
+def sketch_dir_for(csv_path):
+    return os.path.join(os.path.dirname(os.path.abspath(csv_path)), SKETCH_NAME)
+
+def build_cube_frame(flights):
+    operated = ~flights['Cancelled'].to_numpy(bool)
+    metrics = {
+        'n_flights': np.ones(len(flights), dtype=np.int64),
+        'n_cancelled': (~operated).astype(np.int64),
+        'n_operated': operated.astype(np.int64)
+    }
+
+    for prefix, col in DELAYS.items():
+        present = flights[col].notna().to_numpy() & operated
+        minutes = np.where(operated, flights[col].fillna(0).to_numpy(np.int64), 0)
+        metrics[f"{prefix}_delay_n"] = present.astype(np.int64)
+        metrics[f"{prefix}_delay_sum"] = minutes
+        metrics[f"{prefix}_delay_sumsq"] = minutes ** 2
+
+        bucket_idx = np.digitize(minutes, DELAY_BUCKET_EDGES)
+        for i, bucket_col in enumerate(bucket_columns(prefix)):
+            metrics[bucket_col] = ((bucket_idx == i) & operated).astype(np.int64)
+
+    parts = []
+    for direction, (airport_col, time_col) in DIRECTIONS.items():
+        times = flights[time_col]
+        frame = pd.DataFrame({
+            'airport': flights[airport_col].astype(str).where(flights[airport_col].notna()),
+            'direction': direction,
+            'date': times.dt.floor('D').dt.tz_localize(None),
+            'hour': times.dt.hour.fillna(-1).astype(np.int8),
+            **metrics
+        })
+        frame = frame[frame['airport'].notna()]
+        parts.append(frame.groupby(CUBE_KEYS, sort=True, dropna=False).sum().reset_index())
+
+    cube = pd.concat(parts, ignore_index=True)
+    count_cols = [col for col in METRIC_COLUMNS if not col.endswith(('_sum', '_sumsq'))]
+    return cube.astype({col: np.int32 for col in count_cols})
+
+def write_cube_month(frame, target_dir, month, name='cube'):
+    month_dir = os.path.join(target_dir, f"{PARTITION_COLUMN}={month}")
+    os.makedirs(month_dir, exist_ok=True)
+    path = os.path.join(month_dir, f"{name}.parquet")
+    tmp_path = os.path.join(month_dir, f".{name}.parquet.tmp")
+    frame.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+def remove_cube_month(target_dir, month):
+    month_dir = os.path.join(target_dir, f"{PARTITION_COLUMN}={month}")
+    if os.path.isdir(month_dir):
+        shutil.rmtree(month_dir)
+
+def write_aggregates_month(flights, cube_dir, sketch_dir, month):
+    write_cube_month(build_cube_frame(flights), cube_dir, month)
+    write_cube_month(build_sketch_frame(flights, DIRECTIONS, DELAYS), sketch_dir, month, name='sketch')
+
+def refresh_delay_cube(csv_path=FLIGHTS_CSV_PATH, force=False):
+    cube_dir = cube_dir_for(csv_path)
+    sketch_dir = sketch_dir_for(csv_path)
+    store_dir = store_dir_for(csv_path)
+
+    if read_sketch_alpha(sketch_dir) != SKETCH_ALPHA:
+        force = True
+    built = sorted(set(store_months(cube_dir)) & set(store_months(sketch_dir))) if not force else []
+
+    if not flight_store_exists(store_dir):
+        if built:
+            return
+        print("Building delay cube and sketches from the consolidated CSV...")
+        flights = load_flights(CUBE_SOURCE_COLUMNS, csv_path=csv_path, report=False)
+        months = flights['SchedDepUtc'].dt.strftime('%Y-%m').fillna('unknown')
+        for target_dir in [cube_dir, sketch_dir]:
+            for month in store_months(target_dir):
+                remove_cube_month(target_dir, month)
+        for month, month_flights in flights.groupby(months, sort=True):
+            write_aggregates_month(month_flights, cube_dir, sketch_dir, month)
+        write_sketch_alpha(sketch_dir)
+        return
+
+    available = store_months(store_dir)
+    pending = pending_months(store_dir)
+    todo = set(available) if force else (set(pending) | (set(available) - set(built)))
+    stale = (set(store_months(cube_dir)) | set(store_months(sketch_dir))) - set(available)
+
+    for month in sorted(stale):
+        remove_cube_month(cube_dir, month)
+        remove_cube_month(sketch_dir, month)
+    for month in sorted(todo & set(available)):
+        flights = load_flights(CUBE_SOURCE_COLUMNS, csv_path=csv_path, months=[month], report=False)
+        write_aggregates_month(flights, cube_dir, sketch_dir, month)
+    write_sketch_alpha(sketch_dir)
+
+    if todo or stale:
+        print(f"Delay cube and sketches refreshed: {len(todo & set(available))} months rebuilt, {len(stale)} removed.")
+    if pending:
+        clear_pending_months(pending, store_dir)
+
+def read_aggregate(target_dir):
+    frame = pd.read_parquet(target_dir)
+    frame = frame.drop(columns=[PARTITION_COLUMN], errors='ignore')
+    frame['airport'] = frame['airport'].astype('category')
+    frame['direction'] = frame['direction'].astype('category')
+    return frame
+
+def load_delay_cube(csv_path=FLIGHTS_CSV_PATH, refresh=True):
+    if refresh:
+        refresh_delay_cube(csv_path)
+    cube = read_aggregate(cube_dir_for(csv_path))
+    print(f"Delay cube: {len(cube)} rows ({cube.memory_usage(deep=True).sum() / 1024 ** 2:.1f} MB)")
+    return cube
+
+def load_delay_sketch(csv_path=FLIGHTS_CSV_PATH, refresh=True):
+    if refresh:
+        refresh_delay_cube(csv_path)
+    sketch = read_aggregate(sketch_dir_for(csv_path))
+    print(f"Delay sketches: {len(sketch)} buckets, relative error bound {SKETCH_ALPHA:.2%}")
+    return sketch
+
+def rollup(cube, keys, direction=None):
+    if direction is not None:
+        cube = cube[cube['direction'] == direction]
+    return cube.groupby(keys, observed=True)[METRIC_COLUMNS].sum().reset_index()
+
+def count_between(df, prefix, lo=None, hi=None):
+    if (lo is not None and lo not in DELAY_BUCKET_EDGES) or (hi is not None and hi not in DELAY_BUCKET_EDGES):
+        raise ValueError(f"Delay bounds must be cube bucket edges {DELAY_BUCKET_EDGES}, got [{lo}, {hi})")
+
+    total = 0
+    for (b_lo, b_hi), col in zip(bucket_bounds(), bucket_columns(prefix)):
+        above = lo is None or (b_lo is not None and b_lo >= lo)
+        below = hi is None or (b_hi is not None and b_hi <= hi)
+        if above and below:
+            total = total + df[col]
+    return total
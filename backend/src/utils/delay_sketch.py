@@ -0,0 +1,82 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+
+# Log-bucketed quantile sketch in the style of DDSketch. A non-zero delay x lands in bucket
+# k = ceil(log_gamma(|x|)) with gamma = (1 + alpha) / (1 - alpha), and every bucket is read back
+# as 2 * gamma^k / (gamma + 1). Any value returned for a quantile q is therefore within a
+# relative error of alpha of the true delay at rank floor(q * (n - 1)); zero delays are exact.
+# Bucket counts only ever add up, so sketches merge across airports, days and incremental loads.
+SKETCH_ALPHA = float(os.environ.get("DELAY_SKETCH_ALPHA", 0.01))
+SKETCH_KEYS = ['airport', 'direction', 'date']
+SKETCH_META_NAME = '_sketch.json'
+DEFAULT_QUANTILES = [0.5, 0.9, 0.99]
+
+def sketch_gamma(alpha=SKETCH_ALPHA):
+    return (1 + alpha) / (1 - alpha)
+
+def value_to_bucket(values, alpha=SKETCH_ALPHA):
+    values = np.asarray(values, dtype=np.float64)
+    magnitude = np.abs(values)
+    buckets = np.zeros(len(values), dtype=np.int32)
+    nonzero = magnitude > 0
+    k = np.ceil(np.log(magnitude[nonzero]) / np.log(sketch_gamma(alpha))).astype(np.int32)
+    buckets[nonzero] = np.sign(values[nonzero]).astype(np.int32) * (k + 1)
+    return buckets
+
+def bucket_to_value(buckets, alpha=SKETCH_ALPHA):
+    buckets = np.asarray(buckets, dtype=np.int64)
+    gamma = sketch_gamma(alpha)
+    k = np.abs(buckets) - 1
+    values = np.sign(buckets) * 2 * np.power(gamma, k) / (gamma + 1)
+    return np.where(buckets == 0, 0.0, values)
+
+def build_sketch_frame(flights, directions, delays, alpha=SKETCH_ALPHA):
+    operated = ~flights['Cancelled'].to_numpy(bool)
+    parts = []
+    for direction, (airport_col, time_col) in directions.items():
+        minutes = flights[delays[direction]].fillna(0).to_numpy(np.float64)
+        frame = pd.DataFrame({
+            'airport': flights[airport_col].astype(str).where(flights[airport_col].notna()),
+            'direction': direction,
+            'date': flights[time_col].dt.floor('D').dt.tz_localize(None),
+            'bucket': value_to_bucket(minutes, alpha),
+            'count': np.ones(len(flights), dtype=np.int32)
+        })[operated]
+        frame = frame[frame['airport'].notna()]
+        parts.append(frame.groupby(SKETCH_KEYS + ['bucket'], sort=True, dropna=False)['count'].sum().reset_index())
+    return pd.concat(parts, ignore_index=True)
+
+def read_sketch_alpha(sketch_dir):
+    path = os.path.join(sketch_dir, SKETCH_META_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f).get('alpha')
+
+def write_sketch_alpha(sketch_dir, alpha=SKETCH_ALPHA):
+    os.makedirs(sketch_dir, exist_ok=True)
+    with open(os.path.join(sketch_dir, SKETCH_META_NAME), 'w') as f:
+        json.dump({'alpha': alpha}, f)
+
+def sketch_quantiles(sketch, keys, quantiles=DEFAULT_QUANTILES, direction=None, start=None, end=None, alpha=SKETCH_ALPHA):
+    if direction is not None:
+        sketch = sketch[sketch['direction'] == direction]
+    if start is not None:
+        sketch = sketch[sketch['date'] >= pd.Timestamp(start)]
+    if end is not None:
+        sketch = sketch[sketch['date'] <= pd.Timestamp(end)]
+
+    merged = sketch.groupby(keys + ['bucket'], observed=True, sort=True)['count'].sum().reset_index()
+    grouped = merged.groupby(keys, observed=True, sort=False)['count']
+    merged['cum_count'] = grouped.cumsum()
+    merged['n'] = grouped.transform('sum')
+
+    result = merged[keys + ['n']].drop_duplicates(keys).reset_index(drop=True)
+    for q in quantiles:
+        rank = np.floor(q * (merged['n'] - 1))
+        hits = merged[merged['cum_count'] > rank].drop_duplicates(keys)
+        values = pd.Series(bucket_to_value(hits['bucket'], alpha), index=pd.MultiIndex.from_frame(hits[keys]))
+        result[f"p{q * 100:g}"] = values.reindex(pd.MultiIndex.from_frame(result[keys])).values
+    return result
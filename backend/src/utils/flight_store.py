@@ -0,0 +1,223 @@
+import os
+import glob
+import json
+import shutil
+import hashlib
+import pandas as pd
+
+current_script_dir = os.path.dirname(os.path.abspath(__file__))
+src_dir = os.path.dirname(current_script_dir)
+backend_dir = os.path.dirname(src_dir)
+
+DELAYS_DIR = os.path.join(backend_dir, 'data', 'processed', 'delays')
+FLIGHTS_CSV_PATH = os.path.join(DELAYS_DIR, 'delays_consolidated_filtered.csv')
+FLIGHT_STORE_NAME = 'flights_parquet'
+FLIGHT_STORE_DIR = os.path.join(DELAYS_DIR, FLIGHT_STORE_NAME)
+
+PARTITION_COLUMN = 'year_month'
+NUMERIC_COLUMNS = ['MinLateDeparted', 'MinLateArrived', 'Cancelled']
+PARTITION_DATE_COLUMNS = ['SchedDepUtc', 'OrigDate', 'SchedDepLocal']
+MANIFEST_NAME = '_manifest.json'
+
+AIRPORT_COLUMNS = ['SchedDepApt', 'SchedArrApt']
+CATEGORY_COLUMNS = ['AirlineCode']
+DELAY_COLUMNS = ['MinLateDeparted', 'MinLateArrived']
+FLAG_COLUMNS = ['Cancelled']
+UTC_COLUMNS = ['SchedDepUtc', 'SchedArrUtc']
+INT16_MIN, INT16_MAX = -32768, 32767
+
+def prepare_flight_types(df):
+    df = df.copy()
+
+    for col in NUMERIC_COLUMNS:
+        if col in df.columns:
+            values = pd.to_numeric(df[col], errors='coerce')
+            df[col] = values.astype('Int8') if col in FLAG_COLUMNS else values.astype('float64')
+
+    for col in df.columns:
+        if df[col].dtype == object:
+            df[col] = df[col].astype('string')
+
+    partition_dates = None
+    for col in PARTITION_DATE_COLUMNS:
+        if col in df.columns:
+            partition_dates = pd.to_datetime(df[col], errors='coerce', utc=True, format='mixed')
+            break
+
+    if partition_dates is not None:
+        df[PARTITION_COLUMN] = partition_dates.dt.strftime('%Y-%m').fillna('unknown')
+    else:
+        df[PARTITION_COLUMN] = 'unknown'
+    return df
+
+def reset_flight_store(store_dir=FLIGHT_STORE_DIR):
+    if os.path.exists(store_dir):
+        shutil.rmtree(store_dir)
+    os.makedirs(store_dir, exist_ok=True)
+
+def write_flight_partitions(df, store_dir, part_name):
+    typed = prepare_flight_types(df)
+    parts = []
+    for month, month_df in typed.groupby(PARTITION_COLUMN, sort=True):
+        month_dir = os.path.join(store_dir, f"{PARTITION_COLUMN}={month}")
+        os.makedirs(month_dir, exist_ok=True)
+
+        path = os.path.join(month_dir, f"{part_name}.parquet")
+        tmp_path = os.path.join(month_dir, f".{part_name}.parquet.tmp")
+        month_df.drop(columns=[PARTITION_COLUMN]).to_parquet(tmp_path, compression='zstd', index=False)
+        os.replace(tmp_path, path)
+        parts.append((month, os.path.relpath(path, store_dir)))
+    return parts
+
+def remove_flight_parts(store_dir, rel_paths):
+    for rel_path in rel_paths:
+        path = os.path.join(store_dir, rel_path)
+        if os.path.exists(path):
+            os.remove(path)
+        month_dir = os.path.dirname(path)
+        if os.path.isdir(month_dir) and not os.listdir(month_dir):
+            os.rmdir(month_dir)
+
+def file_signature(path):
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+def file_sha256(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def load_ingest_manifest(store_dir=FLIGHT_STORE_DIR):
+    path = os.path.join(store_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def save_ingest_manifest(manifest, store_dir=FLIGHT_STORE_DIR):
+    path = os.path.join(store_dir, MANIFEST_NAME)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+def pending_months(store_dir=FLIGHT_STORE_DIR):
+    manifest = load_ingest_manifest(store_dir)
+    return sorted(manifest.get('dirty_months', [])) if manifest else []
+
+def clear_pending_months(months, store_dir=FLIGHT_STORE_DIR):
+    manifest = load_ingest_manifest(store_dir)
+    if manifest is None:
+        return
+    manifest['dirty_months'] = sorted(set(manifest.get('dirty_months', [])) - set(months))
+    save_ingest_manifest(manifest, store_dir)
+
+def flight_part_paths(store_dir=FLIGHT_STORE_DIR, rel_paths=None):
+    if rel_paths is not None:
+        return sorted(os.path.join(store_dir, rel_path) for rel_path in rel_paths)
+    return sorted(glob.glob(os.path.join(store_dir, f"{PARTITION_COLUMN}=*", '*.parquet')))
+
+def unreferenced_flight_parts(store_dir, manifest):
+    referenced = {rel_path for entry in manifest['files'].values() for rel_path in entry['parts']}
+    prefix = f"{PARTITION_COLUMN}="
+    orphans = []
+    for path in flight_part_paths(store_dir):
+        rel_path = os.path.relpath(path, store_dir)
+        if rel_path not in referenced:
+            orphans.append((os.path.dirname(rel_path)[len(prefix):], rel_path))
+    return orphans
+
+def store_months(store_dir=FLIGHT_STORE_DIR):
+    if not os.path.isdir(store_dir):
+        return []
+    prefix = f"{PARTITION_COLUMN}="
+    return sorted(name[len(prefix):] for name in os.listdir(store_dir) if name.startswith(prefix))
+
+def flight_store_exists(store_dir=FLIGHT_STORE_DIR):
+    return os.path.isdir(store_dir) and any(name.startswith(f"{PARTITION_COLUMN}=") for name in os.listdir(store_dir))
+
+def store_dir_for(csv_path):
+    return os.path.join(os.path.dirname(os.path.abspath(csv_path)), FLIGHT_STORE_NAME)
+
+def flight_data_exists(csv_path=FLIGHTS_CSV_PATH):
+    return flight_store_exists(store_dir_for(csv_path)) or os.path.exists(csv_path)
+
+def write_month_dataset(df, dataset_dir, time_col='SchedDepUtc', part_name='part-0'):
+    dataset_dir = os.path.abspath(dataset_dir)
+    tmp_dir = os.path.join(os.path.dirname(dataset_dir), f".{os.path.basename(dataset_dir)}.tmp")
+    reset_flight_store(tmp_dir)
+
+    months = pd.to_datetime(df[time_col], errors='coerce', utc=True).dt.strftime('%Y-%m').fillna('unknown')
+    for month, month_df in df.groupby(months.to_numpy(), sort=True):
+        month_dir = os.path.join(tmp_dir, f"{PARTITION_COLUMN}={month}")
+        os.makedirs(month_dir, exist_ok=True)
+        month_df.to_parquet(os.path.join(month_dir, f"{part_name}.parquet"),
+                            compression='zstd', index=False, write_statistics=True)
+
+    if os.path.exists(dataset_dir):
+        shutil.rmtree(dataset_dir)
+    os.replace(tmp_dir, dataset_dir)
+    return sorted(months.unique())
+
+def read_month_dataset(dataset_dir, columns=None, months=None):
+    filters = [(PARTITION_COLUMN, 'in', list(months))] if months is not None else None
+    df = pd.read_parquet(dataset_dir, columns=columns, filters=filters)
+    return df.drop(columns=[PARTITION_COLUMN], errors='ignore') if columns is None else df
+
+def read_flights(columns=None, csv_path=FLIGHTS_CSV_PATH, months=None):
+    store_dir = store_dir_for(csv_path)
+    if flight_store_exists(store_dir):
+        return read_month_dataset(store_dir, columns, months or None)
+
+    print(f"Flight store not found at {store_dir}, falling back to CSV.")
+    return pd.read_csv(csv_path, usecols=columns, low_memory=False)
+
+def apply_flight_schema(df):
+    airport_cols = [col for col in AIRPORT_COLUMNS if col in df.columns]
+    if airport_cols:
+        codes = pd.concat([df[col].dropna().astype(str) for col in airport_cols]).unique()
+        airport_dtype = pd.CategoricalDtype(sorted(codes))
+        for col in airport_cols:
+            df[col] = df[col].astype(airport_dtype)
+
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+
+    for col in DELAY_COLUMNS:
+        if col in df.columns:
+            minutes = pd.to_numeric(df[col], errors='coerce').round()
+            df[col] = minutes.where(minutes.between(INT16_MIN, INT16_MAX)).astype('Int16')
+
+    for col in FLAG_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).ne(0).astype(bool)
+
+    for col in UTC_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], errors='coerce', utc=True)
+    return df
+
+def flight_memory_report(df):
+    usage = df.memory_usage(deep=True, index=False)
+    return pd.DataFrame({
+        'dtype': df.dtypes.astype(str),
+        'mb': (usage / 1024 ** 2).round(2)
+    }).sort_values('mb', ascending=False)
+
+def load_flights(columns=None, csv_path=FLIGHTS_CSV_PATH, months=None, report=True):
+    df = read_flights(columns, csv_path=csv_path, months=months)
+    raw_mb = df.memory_usage(deep=True).sum() / 1024 ** 2 if report else None
+    df = apply_flight_schema(df)
+
+    if report:
+        compact_mb = df.memory_usage(deep=True).sum() / 1024 ** 2
+        print(f"Flight table: {len(df)} rows x {df.shape[1]} columns, "
+              f"{compact_mb:.1f} MB in memory ({raw_mb:.1f} MB before schema, x{raw_mb / max(compact_mb, 1e-9):.1f} smaller)")
+    return df
+
+if __name__ == "__main__":
+    flights = load_flights()
+    print(flight_memory_report(flights).to_string())
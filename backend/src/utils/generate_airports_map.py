@@ -10,6 +10,10 @@ from rasterio.windows import from_bounds
 current_script_dir = os.path.dirname(os.path.abspath(__file__))
 src_dir = os.path.dirname(current_script_dir)
 backend_dir = os.path.dirname(src_dir)
+sys.path.append(src_dir)
+
+from utils.flight_store import flight_data_exists
+from utils.delay_cube import load_delay_cube, rollup
 
 AIRPORTS_CSV_PATH = os.path.join(backend_dir, 'data', 'processed', 'airports', 'airports_filtered.csv')
 RAW_AIRPORTS_CSV_PATH = os.path.join(backend_dir, 'data', 'raw', 'airports', 'airports.csv')
@@ -111,11 +115,12 @@ def generate_map():
         print(f"Warning: Population TIF file not found at {POPULATION_TIF_PATH}. Heatmap will be limited.")
         airports_df['population'] = 0
 
-    if os.path.exists(DELAYS_CSV_PATH):
+    if flight_data_exists(DELAYS_CSV_PATH):
         print("Loading flight data (counting departures)...")
-        flights_df = pd.read_csv(DELAYS_CSV_PATH, usecols=['SchedDepApt'])
-        flight_counts = flights_df['SchedDepApt'].value_counts().reset_index()
+        cube = load_delay_cube(DELAYS_CSV_PATH)
+        flight_counts = rollup(cube, ['airport'], direction='dep')[['airport', 'n_flights']]
         flight_counts.columns = ['iata_code', 'flight_count']
+        flight_counts['iata_code'] = flight_counts['iata_code'].astype(str)
         
         airports_df = pd.merge(airports_df, flight_counts, on='iata_code', how='left')
         airports_df['flight_count'] = airports_df['flight_count'].fillna(0)
@@ -0,0 +1,65 @@
+import json
+import ahocorasick
+import pandas as pd
+
+def load_keyword_groups(json_path, lowercase=True):
+    with open(json_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    groups = {}
+    for lang in data:
+        for category in data[lang]:
+            words = [w.lower() if lowercase else w for w in data[lang][category]]
+            groups.setdefault((lang, category), []).extend(words)
+    return groups
+
+def is_word_char(ch):
+    return ch.isalnum() or ch == '_'
+
+class KeywordTagger:
+    def __init__(self, keyword_groups, word_boundaries=False):
+        self.word_boundaries = word_boundaries
+        self.labels = list(keyword_groups.keys())
+
+        entries = {}
+        for label, words in keyword_groups.items():
+            for word in words:
+                word = word.lower()
+                if word:
+                    entries.setdefault(word, set()).add(label)
+
+        self.automaton = ahocorasick.Automaton()
+        for word, labels in entries.items():
+            self.automaton.add_word(word, (len(word), frozenset(labels)))
+        self.automaton.make_automaton()
+        self.num_keywords = len(entries)
+
+    def tag(self, text):
+        if not isinstance(text, str) or not text or self.num_keywords == 0:
+            return set()
+
+        text = text.lower()
+        found = set()
+        for end, (length, labels) in self.automaton.iter(text):
+            if labels <= found:
+                continue
+            if self.word_boundaries:
+                start = end - length + 1
+                if start > 0 and is_word_char(text[start - 1]):
+                    continue
+                if end + 1 < len(text) and is_word_char(text[end + 1]):
+                    continue
+            found |= labels
+        return found
+
+    def tag_series(self, texts):
+        return [self.tag(text) for text in texts]
+
+def tag_keyword_columns(texts, tagger):
+    tags = tagger.tag_series(texts)
+    categories = sorted({label[1] for label in tagger.labels})
+    languages = sorted({label[0] for label in tagger.labels})
+
+    columns = {f"kw_{category}": [any(label[1] == category for label in t) for t in tags] for category in categories}
+    columns['kw_languages'] = ['|'.join(sorted({label[0] for label in t} & set(languages))) for t in tags]
+    return pd.DataFrame(columns, index=getattr(texts, 'index', None))
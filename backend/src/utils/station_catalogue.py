@@ -0,0 +1,77 @@
+import os
+import time
+import numpy as np
+import pandas as pd
+from sklearn.neighbors import BallTree
+
+current_script_dir = os.path.dirname(os.path.abspath(__file__))
+src_dir = os.path.dirname(current_script_dir)
+backend_dir = os.path.dirname(src_dir)
+
+STATION_CATALOGUE_PATH = os.path.join(backend_dir, 'data', 'raw', 'meteostat_stations.parquet')
+CATALOGUE_MAX_AGE_DAYS = int(os.environ.get("STATION_CATALOGUE_MAX_AGE_DAYS", 30))
+CATALOGUE_COLUMNS = ['icao', 'latitude', 'longitude', 'hourly_start', 'hourly_end']
+
+EARTH_RADIUS_KM = 6371.0
+NEARBY_STATIONS = 5
+MIN_COVERAGE = 0.5
+
+def refresh_station_catalogue(path=STATION_CATALOGUE_PATH):
+    from meteostat import Stations
+
+    print("Downloading Meteostat station catalogue...")
+    stations = Stations().fetch()[CATALOGUE_COLUMNS]
+    stations.index = stations.index.astype(str)
+    stations.index.name = 'id'
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+    stations.to_parquet(tmp_path)
+    os.replace(tmp_path, path)
+    print(f"Saved {len(stations)} stations to {path}")
+    return stations
+
+def load_station_catalogue(path=STATION_CATALOGUE_PATH, max_age_days=CATALOGUE_MAX_AGE_DAYS):
+    if os.path.exists(path):
+        age_days = (time.time() - os.path.getmtime(path)) / 86400
+        if age_days <= max_age_days:
+            return pd.read_parquet(path)
+        try:
+            return refresh_station_catalogue(path)
+        except Exception as e:
+            print(f"Could not refresh station catalogue ({e}), using cached copy from {age_days:.0f} days ago.")
+            return pd.read_parquet(path)
+    return refresh_station_catalogue(path)
+
+class StationLocator:
+    def __init__(self, catalogue):
+        catalogue = catalogue.dropna(subset=['latitude', 'longitude'])
+        self.station_ids = catalogue.index.astype(str).to_numpy()
+        self.icao_to_row = {code: i for i, code in enumerate(catalogue['icao']) if isinstance(code, str) and code}
+        self.hourly_start = pd.to_datetime(catalogue['hourly_start']).to_numpy()
+        self.hourly_end = pd.to_datetime(catalogue['hourly_end']).to_numpy()
+        self.tree = BallTree(np.radians(catalogue[['latitude', 'longitude']].to_numpy()), metric='haversine')
+
+    def coverage(self, rows, start, end):
+        start, end = np.datetime64(start), np.datetime64(end)
+        overlap_start = np.maximum(self.hourly_start[rows], start)
+        overlap_end = np.minimum(self.hourly_end[rows], end)
+        overlap = (overlap_end - overlap_start) / (end - start)
+        return np.nan_to_num(np.clip(overlap.astype(np.float64), 0, 1))
+
+    def rank(self, idents, lats, lons, start, end, k=NEARBY_STATIONS):
+        points = np.radians(np.column_stack([lats, lons]).astype(np.float64))
+        distances, rows = self.tree.query(points, k=min(k, len(self.station_ids)))
+        distances = distances * EARTH_RADIUS_KM
+
+        ranked = {}
+        for ident, near_rows, near_km in zip(idents, rows, distances):
+            icao_row = self.icao_to_row.get(ident)
+            coverage = self.coverage(near_rows, start, end)
+            # ICAO match first, then stations with enough hourly history by distance, then the rest.
+            order = np.lexsort((near_km, coverage < MIN_COVERAGE, near_rows != icao_row))
+            station_ids = [self.station_ids[near_rows[i]] for i in order]
+            if icao_row is not None and icao_row not in near_rows:
+                station_ids.insert(0, self.station_ids[icao_row])
+            ranked[ident] = station_ids
+        return ranked
@@ -0,0 +1,235 @@
+import os
+import glob
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from pathlib import Path
+
+def to_epoch_units(times, unit):
+    times = pd.DatetimeIndex(times)
+    if times.tz is not None:
+        times = times.tz_convert(None)
+    units = times.values.astype(f'datetime64[{unit}]').astype(np.int64)
+    return units, ~np.isnat(times.values)
+
+def to_epoch_hours(times):
+    return to_epoch_units(times, 'h')
+
+def to_epoch_seconds(times):
+    return to_epoch_units(times, 's')
+
+def naive_utc_index(values):
+    times = pd.DatetimeIndex(pd.to_datetime(values))
+    return times.tz_convert(None) if times.tz is not None else times
+
+def normalize_timestamp(value):
+    value = pd.Timestamp(value)
+    return value.tz_convert(None) if value.tz is not None else value
+
+def time_column_name(schema_names):
+    for name in ['time', '__index_level_0__']:
+        if name in schema_names:
+            return name
+    return None
+
+def select_window(df, start, end):
+    in_window = np.ones(len(df), dtype=bool)
+    if start is not None:
+        in_window &= df.index >= start
+    if end is not None:
+        in_window &= df.index <= end
+    return df[in_window]
+
+def read_station_frame(path, columns=None, start=None, end=None, io_stats=None):
+    pf = pq.ParquetFile(path)
+    names = pf.schema_arrow.names
+    time_col = time_column_name(names)
+    if time_col is None:
+        df = pd.read_parquet(path, columns=columns)
+        df.index = naive_utc_index(df.index)
+        return select_window(df, start, end)
+
+    wanted = [c for c in names if c != time_col and (columns is None or c in columns)]
+    wanted_idx = {i for i, c in enumerate(names) if c in wanted or c == time_col}
+    time_idx = names.index(time_col)
+
+    keep = []
+    for rg in range(pf.num_row_groups):
+        meta = pf.metadata.row_group(rg)
+        stats = meta.column(time_idx).statistics
+        selected = True
+        if stats is not None and stats.has_min_max:
+            if start is not None and normalize_timestamp(stats.max) < start:
+                selected = False
+            if end is not None and normalize_timestamp(stats.min) > end:
+                selected = False
+
+        for i in range(meta.num_columns):
+            size = meta.column(i).total_compressed_size
+            key = 'bytes_read' if selected and i in wanted_idx else 'bytes_skipped'
+            if io_stats is not None:
+                io_stats[key] = io_stats.get(key, 0) + size
+        if selected:
+            keep.append(rg)
+
+    table = pf.read_row_groups(keep, columns=wanted + [time_col], use_pandas_metadata=False)
+    df = table.to_pandas(ignore_metadata=True)
+    df.index = naive_utc_index(df.pop(time_col))
+    return select_window(df, start, end)
+
+class WeatherIndex:
+    def __init__(self, stations, columns, start_hours, lengths, values, present):
+        self.stations = list(stations)
+        self.station_idx = {icao: i for i, icao in enumerate(self.stations)}
+        self.columns = list(columns)
+        self.start_hours = np.asarray(start_hours, dtype=np.int64)
+        self.lengths = np.asarray(lengths, dtype=np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(self.lengths)[:-1]]).astype(np.int64)
+        self.values = values
+        self.present = present
+        self.observed = np.flatnonzero(present)
+
+    @classmethod
+    def from_directory(cls, weather_dir, columns=None, start=None, end=None):
+        files = sorted(glob.glob(os.path.join(weather_dir, "*.parquet")))
+        start = normalize_timestamp(start) if start is not None else None
+        end = normalize_timestamp(end) if end is not None else None
+        stations, start_hours, lengths, blocks = [], [], [], []
+        found_columns = []
+        io_stats = {'bytes_read': 0, 'bytes_skipped': 0}
+
+        for f in files:
+            try:
+                df = read_station_frame(f, columns, start, end, io_stats)
+            except Exception as e:
+                print(f"Error loading {f}: {e}")
+                continue
+
+            hours, valid = to_epoch_hours(df.index)
+            if not valid.any():
+                continue
+            hours = hours[valid]
+            df = df[valid]
+
+            first_hour = hours.min()
+            length = hours.max() - first_hour + 1
+            slots = hours - first_hour
+
+            for col in df.columns:
+                if col not in found_columns:
+                    found_columns.append(col)
+
+            stations.append(Path(f).stem)
+            start_hours.append(first_hour)
+            lengths.append(length)
+            blocks.append((slots, df))
+
+        if not stations:
+            raise ValueError("No weather data loaded.")
+
+        if columns is not None:
+            found_columns = [c for c in columns if c in found_columns]
+        columns = found_columns
+
+        total_bytes = io_stats['bytes_read'] + io_stats['bytes_skipped']
+        print(f"Weather Parquet I/O: read {io_stats['bytes_read'] / 1024 ** 2:.1f} MB, "
+              f"skipped {io_stats['bytes_skipped'] / 1024 ** 2:.1f} MB "
+              f"({io_stats['bytes_skipped'] / max(total_bytes, 1) * 100:.1f}% pruned by columns and time window)")
+
+        total = int(np.sum(lengths))
+        values = {}
+        for col in columns:
+            numeric = all(pd.api.types.is_numeric_dtype(df[col]) for _, df in blocks if col in df.columns)
+            values[col] = np.full(total, np.nan) if numeric else np.full(total, None, dtype=object)
+
+        present = np.zeros(total, dtype=bool)
+        offset = 0
+        for (slots, df), length in zip(blocks, lengths):
+            present[offset + slots] = True
+            for col in columns:
+                if col in df.columns:
+                    values[col][offset + slots] = df[col].to_numpy()
+            offset += length
+
+        print(f"Indexed weather for {len(stations)} stations: {total} hourly slots x {len(columns)} variables.")
+        return cls(stations, columns, start_hours, lengths, values, present)
+
+    def nearest_positions(self, station_idx, seconds, valid, tolerance_seconds):
+        # Every station owns a contiguous block of hourly slots, so the observed slots form one
+        # sorted array; each search is clamped to the station's own range of observations.
+        # Hourly slots only index the storage; distances are measured in seconds.
+        station_idx = np.asarray(station_idx, dtype=np.int64)
+        ok = valid & (station_idx >= 0)
+        slots = np.full(len(station_idx), -1, dtype=np.int64)
+        offsets = np.full(len(station_idx), np.nan)
+        if not ok.any() or len(self.observed) == 0:
+            return slots, offsets
+
+        idx = station_idx[ok]
+        block_start = self.offsets[idx]
+        first_obs = np.searchsorted(self.observed, block_start, side='left')
+        last_obs = np.searchsorted(self.observed, block_start + self.lengths[idx], side='left') - 1
+        target = block_start * 3600 + (seconds[ok] - self.start_hours[idx] * 3600)
+
+        right = np.searchsorted(self.observed * 3600, target, side='left')
+        left = np.clip(right - 1, first_obs, last_obs)
+        right = np.clip(right, first_obs, last_obs)
+        has_obs = last_obs >= first_obs
+
+        best_pos = np.full(len(idx), -1, dtype=np.int64)
+        best_gap = np.full(len(idx), np.inf)
+        for candidate in [left, right]:
+            pos = self.observed[np.clip(candidate, 0, len(self.observed) - 1)]
+            gap = pos * 3600 - target
+            usable = has_obs & (np.abs(gap) <= tolerance_seconds)
+            better = usable & (np.abs(gap) < np.abs(best_gap))
+            best_pos[better] = pos[better]
+            best_gap[better] = gap[better]
+
+        slots[ok] = best_pos
+        offsets[ok] = np.where(best_pos >= 0, best_gap, np.nan)
+        return slots, offsets
+
+    def slot_times(self, slots):
+        times = np.full(len(slots), np.datetime64('NaT'), dtype='datetime64[h]')
+        found = slots >= 0
+        station = np.searchsorted(self.offsets, slots[found], side='right') - 1
+        hours = self.start_hours[station] + slots[found] - self.offsets[station]
+        times[found] = hours.astype('datetime64[h]')
+        return pd.to_datetime(times.astype('datetime64[s]'))
+
+    def gather(self, slots, column):
+        source = self.values[column]
+        found = slots >= 0
+        if source.dtype == object:
+            out = np.full(len(slots), None, dtype=object)
+        else:
+            out = np.full(len(slots), np.nan)
+        out[found] = source[slots[found]]
+        return out
+
+    def lookup_codes(self, icao_codes):
+        return np.array([self.station_idx.get(code, -1) for code in icao_codes], dtype=np.int64)
+
+def attach_weather(flights, index, airport_col, time_col, prefix, iata_to_icao, tolerance=pd.Timedelta(minutes=30)):
+    airports = flights[airport_col]
+    if not isinstance(airports.dtype, pd.CategoricalDtype):
+        airports = airports.astype('category')
+
+    category_stations = index.lookup_codes([iata_to_icao.get(str(code)) for code in airports.cat.categories])
+    station_idx = np.append(category_stations, -1)[airports.cat.codes.to_numpy()]
+
+    seconds, valid = to_epoch_seconds(flights[time_col])
+    tolerance_seconds = pd.Timedelta(tolerance).total_seconds()
+    slots, offsets = index.nearest_positions(station_idx, seconds, valid, tolerance_seconds)
+
+    flights[f"{prefix}Hour"] = index.slot_times(slots)
+    for col in index.columns:
+        flights[f"{prefix}_{col}"] = index.gather(slots, col)
+
+    matched = slots >= 0
+    return {
+        'matched': int(matched.sum()),
+        'match_rate': float(matched.mean()) if len(matched) else 0.0,
+        'mean_offset_min': float(np.abs(offsets[matched]).mean() / 60) if matched.any() else float('nan')
+    }